@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Company, ServiceCategory, Service, Employee, Client, Appointment, WorkSchedule, LeaveDay
+from .models import Company, ServiceCategory, Service, Employee, Client, Appointment, WorkSchedule, LeaveDay, \
+    AppointmentSeries, AppointmentSeriesException
 
 
 @admin.register(Company)
@@ -69,4 +70,19 @@ class LeaveDayAdmin(admin.ModelAdmin):
     list_display = ('employee', 'date')
     list_filter = ('employee', 'date')
     search_fields = ('employee__name',)
-    ordering = ('employee', 'date')
\ No newline at end of file
+    ordering = ('employee', 'date')
+
+
+# Inline admin pentru excepțiile unei serii
+class AppointmentSeriesExceptionInline(admin.TabularInline):
+    model = AppointmentSeriesException
+    extra = 0
+
+
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ('client', 'service', 'employee', 'start', 'frequency', 'interval', 'until', 'count', 'status')
+    search_fields = ('client__name', 'service__name', 'employee__name')
+    list_filter = ('status', 'frequency')
+    ordering = ['start']
+    inlines = [AppointmentSeriesExceptionInline]
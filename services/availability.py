@@ -0,0 +1,206 @@
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import repeat
+
+from django.utils import timezone
+
+from .models import Appointment, Employee, LeaveDay
+from .recurrence import series_busy
+
+DEFAULT_SLOT_STEP = 15  # minutes
+MAX_RANGE_DAYS = 31
+
+
+def daterange(date_from, date_to):
+    """
+    Yield every date between date_from and date_to, both inclusive.
+    """
+    day = date_from
+    while day <= date_to:
+        yield day
+        day += timedelta(days=1)
+
+
+def window_bounds(date_from, date_to):
+    """
+    Return the [start, end) datetimes covering the whole date range.
+    """
+    return datetime.combine(date_from, time.min), datetime.combine(date_to + timedelta(days=1), time.min)
+
+
+def merge_intervals(intervals):
+    """
+    Merge overlapping or touching intervals. The input must be sorted by start.
+    """
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def overlapping_pairs(intervals):
+    """
+    Sweep (start, end, key) intervals and yield (key, other_key) for every interval that overlaps
+    one starting no later than it. Empty intervals never overlap anything.
+    """
+    latest = None  # the interval reaching furthest so far
+    for start, end, key in sorted(intervals, key=lambda interval: (interval[0], interval[1])):
+        if end <= start:
+            continue
+        if latest and start < latest[1]:
+            yield key, latest[2]
+        if latest is None or end > latest[1]:
+            latest = (start, end, key)
+
+
+def working_intervals(schedules, leave_dates, date_from, date_to):
+    """
+    Expand the weekly WorkSchedule rows into concrete (start, end) datetimes for every day
+    of the range, skipping leave days and rows without a start/end time.
+    """
+    by_day = defaultdict(list)
+    for schedule in schedules:
+        if schedule.start_time and schedule.end_time and schedule.start_time < schedule.end_time:
+            by_day[schedule.day_of_week].append((schedule.start_time, schedule.end_time))
+
+    intervals = []
+    for day in daterange(date_from, date_to):
+        if day in leave_dates:
+            continue
+        for start, end in sorted(by_day.get(day.weekday(), [])):
+            intervals.append((datetime.combine(day, start), datetime.combine(day, end)))
+    return merge_intervals(intervals)
+
+
+def free_intervals(working, busy):
+    """
+    Subtract the busy intervals from the working intervals in a single sweep.
+
+    Both lists must be sorted by start; working intervals must not overlap each other.
+    """
+    free = []
+    first = 0
+    for start, end in working:
+        cursor = start
+        # Busy intervals finished before this working interval can never matter again
+        while first < len(busy) and busy[first][1] <= cursor:
+            first += 1
+
+        index = first
+        while index < len(busy) and busy[index][0] < end:
+            busy_start, busy_end = busy[index]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            index += 1
+
+        if cursor < end:
+            free.append((cursor, end))
+    return free
+
+
+def slot_starts(free, duration, step, not_before=None):
+    """
+    Yield the start times, aligned to `step` from midnight, at which `duration` fits entirely
+    inside one of the free intervals.
+    """
+    for start, end in free:
+        if not_before and start < not_before:
+            start = not_before
+        remainder = (start - datetime.combine(start.date(), time.min)) % step
+        if remainder:
+            start += step - remainder
+
+        while start + duration <= end:
+            yield start
+            start += step
+
+
+def _bookable(schedules, leave_dates, busy, service, date_from, date_to, step, now):
+    free = free_intervals(working_intervals(schedules, leave_dates, date_from, date_to), busy)
+    return slot_starts(free, timedelta(minutes=service.time), timedelta(minutes=step), not_before=now)
+
+
+def employee_slots(employee, service, date_from, date_to, step=DEFAULT_SLOT_STEP):
+    """
+    Return the bookable start times for `service` with `employee` between date_from and date_to.
+    """
+    window_start, window_end = window_bounds(date_from, date_to)
+
+    schedules = employee.work_schedules.all()
+    leave_dates = set(
+        LeaveDay.objects.filter(employee=employee, date__range=(date_from, date_to))
+        .values_list('date', flat=True)
+    )
+    busy = list(
+        Appointment.objects.filter(employee=employee)
+        .blocking()
+        .overlapping(window_start, window_end)
+        .order_by('date')
+        .values_list('date', 'end_date')
+    )
+    occurrences = series_busy([employee.id], window_start, window_end).get(employee.id)
+    if occurrences:
+        busy = sorted(busy + [(occurrence.date, occurrence.end_date) for occurrence in occurrences])
+
+    return list(_bookable(schedules, leave_dates, busy, service, date_from, date_to, step, timezone.now()))
+
+
+def category_slots(user, category, service, date_from, date_to, step=DEFAULT_SLOT_STEP):
+    """
+    Return the union of bookable start times over every employee of the category, earliest first,
+    as (start, [employee ids]) pairs.
+
+    Schedules, leave days, appointments and series of all employees are loaded in a fixed number of
+    queries and the per-employee slot streams are merged in a single pass.
+    """
+    window_start, window_end = window_bounds(date_from, date_to)
+
+    employees = list(
+        Employee.objects.filter(user=user, service_categories=category)
+        .prefetch_related('work_schedules')
+    )
+    employee_ids = [employee.id for employee in employees]
+
+    leave_dates = defaultdict(set)
+    for employee_id, day in LeaveDay.objects.filter(
+        employee_id__in=employee_ids, date__range=(date_from, date_to)
+    ).values_list('employee_id', 'date'):
+        leave_dates[employee_id].add(day)
+
+    busy = defaultdict(list)
+    for employee_id, start, end in (
+        Appointment.objects.filter(employee_id__in=employee_ids)
+        .blocking()
+        .overlapping(window_start, window_end)
+        .order_by('employee_id', 'date')
+        .values_list('employee_id', 'date', 'end_date')
+    ):
+        busy[employee_id].append((start, end))
+    for employee_id, occurrences in series_busy(employee_ids, window_start, window_end).items():
+        busy[employee_id] = sorted(busy[employee_id] + [(occurrence.date, occurrence.end_date) for occurrence in occurrences])
+
+    now = timezone.now()
+    streams = [
+        zip(
+            _bookable(
+                employee.work_schedules.all(), leave_dates[employee.id], busy[employee.id],
+                service, date_from, date_to, step, now,
+            ),
+            repeat(employee.id),
+        )
+        for employee in employees
+    ]
+
+    slots = []
+    for start, employee_id in heapq.merge(*streams):
+        if slots and slots[-1][0] == start:
+            slots[-1][1].append(employee_id)
+        else:
+            slots.append((start, [employee_id]))
+    return slots
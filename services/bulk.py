@@ -0,0 +1,397 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .availability import overlapping_pairs
+from .cache import REFERENCE_DATA, bump_version
+from .conditional import touch
+from .occupancy import affected_days, refresh_after_commit, refresh_weekdays
+from .models import Appointment, Client, Employee, Service, WorkSchedule, APPOINTMENT_OVERLAP_CONSTRAINT
+from .recurrence import series_busy
+
+BULK_MAX_ITEMS = 500
+
+APPOINTMENT_FIELDS = ['client', 'service', 'employee', 'date', 'end_date', 'status', 'updated_at']
+WORK_SCHEDULE_FIELDS = ['employee', 'day_of_week', 'start_time', 'end_time']
+
+
+def _raise_if_errors(errors):
+    """
+    Bulk writes are all or nothing: report every item's errors, in request order, and write nothing.
+    """
+    if any(errors):
+        raise ValidationError(errors)
+
+
+def _format(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _resolve(model, user, ids, field, items, errors):
+    """
+    Map ids to the user's objects in one query, recording an error for every unknown id.
+    """
+    objects = model.objects.filter(user=user).in_bulk(set(ids))
+    for index, item in enumerate(items):
+        if field in item and item[field] not in objects:
+            errors[index].setdefault(field, []).append(f"Invalid pk \"{item[field]}\" - object does not exist.")
+    return objects
+
+
+def _day_windows(appointments):
+    """
+    Map employee id to the runs of consecutive days its appointments in the batch cover, so a batch
+    spread over months reads only the days it books and not everything in between.
+    """
+    days = defaultdict(set)
+    for appointment in appointments:
+        day = appointment.date.date()
+        while day <= appointment.end_date.date():
+            days[appointment.employee_id].add(day)
+            day += timedelta(days=1)
+
+    windows = defaultdict(list)
+    for employee_id, employee_days in days.items():
+        for day in sorted(employee_days):
+            start, end = datetime.combine(day, time.min), datetime.combine(day + timedelta(days=1), time.min)
+            runs = windows[employee_id]
+            if runs and runs[-1][1] == start:
+                runs[-1] = (runs[-1][0], end)
+            else:
+                runs.append((start, end))
+    return windows
+
+
+def appointment_conflicts(appointments, errors, exclude_ids=()):
+    """
+    Check the batch against the employees' existing appointments, series occurrences and against
+    itself, reading only the employee days the batch books, and record duplicate and overlap errors
+    on the offending items.
+    """
+    dated = [(index, appointment) for index, appointment in enumerate(appointments) if appointment is not None]
+    if not dated:
+        return
+
+    windows = _day_windows(appointment for _, appointment in dated)
+    booked = Q()
+    for employee_id, runs in windows.items():
+        for start, end in runs:
+            booked |= Q(employee_id=employee_id, date__lte=end, end_date__gte=start)
+    window_start = min(start for runs in windows.values() for start, _ in runs)
+    window_end = max(end for runs in windows.values() for _, end in runs)
+    employee_ids = set(windows)
+    existing = list(
+        Appointment.objects.filter(booked)
+        .exclude(pk__in=exclude_ids)
+        .only('id', 'client_id', 'service_id', 'employee_id', 'date', 'end_date', 'status')
+    )
+
+    # Same client, service, employee and date as another appointment (see AppointmentViewSet.perform_create)
+    seen = {(row.client_id, row.service_id, row.employee_id, row.date) for row in existing}
+    for index, appointment in dated:
+        key = (appointment.client_id, appointment.service_id, appointment.employee_id, appointment.date)
+        if key in seen:
+            errors[index].setdefault('non_field_errors', []).append(
+                "An appointment with this service, employee, and date already exists."
+            )
+        seen.add(key)
+
+    intervals = defaultdict(list)
+    for row in existing:
+        if row.status != 'cancelled':
+            intervals[row.employee_id].append((row.date, row.end_date, (False, row)))
+    for employee_id, occurrences in series_busy(employee_ids, window_start, window_end).items():
+        intervals[employee_id].extend(
+            (occurrence.date, occurrence.end_date, (False, occurrence)) for occurrence in occurrences
+            if any(occurrence.date <= end and occurrence.end_date >= start for start, end in windows[employee_id])
+        )
+    for index, appointment in dated:
+        if appointment.status != 'cancelled':
+            intervals[appointment.employee_id].append((appointment.date, appointment.end_date, (True, index)))
+
+    for employee_intervals in intervals.values():
+        for (later_is_new, later), (earlier_is_new, earlier) in overlapping_pairs(employee_intervals):
+            if later_is_new:
+                index, conflict = later, (appointments[earlier] if earlier_is_new else earlier)
+            elif earlier_is_new:
+                index, conflict = earlier, later
+            else:
+                continue  # both already stored, not this batch's problem
+            appointment = appointments[index]
+            errors[index].setdefault('date', []).append(
+                f"{appointment.employee.name} is already booked between "
+                f"{_format(conflict.date)} and {_format(conflict.end_date)}. "
+                "Please choose another time."
+            )
+
+
+def _build_appointments(user, items, errors, instances=None):
+    """
+    Resolve the foreign keys of every item in three queries and build (or update) the
+    Appointment objects, computing end_date as Appointment.save does.
+    """
+    clients = _resolve(Client, user, [item['client_id'] for item in items if 'client_id' in item],
+                       'client_id', items, errors)
+    services = _resolve(Service, user, [item['service_id'] for item in items if 'service_id' in item],
+                        'service_id', items, errors)
+    employees = _resolve(Employee, user, [item['employee_id'] for item in items if 'employee_id' in item],
+                         'employee_id', items, errors)
+
+    appointments = []
+    for index, item in enumerate(items):
+        appointment = Appointment(user=user) if instances is None else instances.get(item.get('id'))
+        if errors[index] or appointment is None:
+            appointments.append(None)
+            continue
+
+        if 'client_id' in item:
+            appointment.client = clients[item['client_id']]
+        if 'service_id' in item:
+            appointment.service = services[item['service_id']]
+        if 'employee_id' in item:
+            appointment.employee = employees[item['employee_id']]
+        for field in ('date', 'status'):
+            if field in item:
+                setattr(appointment, field, item[field])
+
+        if appointment.date is None:
+            errors[index].setdefault('date', []).append("This field is required.")
+            appointments.append(None)
+            continue
+        appointment.end_date = appointment.date + timedelta(minutes=appointment.service.time)
+        appointments.append(appointment)
+    return appointments
+
+
+def _write(user, callback):
+    try:
+        with transaction.atomic():
+            result = callback()
+            # bulk_create and bulk_update send no post_save, so record the change in the same transaction
+            touch(user.pk, Appointment)
+            return result
+    except IntegrityError as exc:
+        if APPOINTMENT_OVERLAP_CONSTRAINT not in str(exc):
+            raise
+        raise ValidationError("Another booking overlapping this batch was saved meanwhile. Please retry.")
+
+
+def create_appointments(user, items):
+    """
+    Validate and insert a batch of appointments with a single bulk_create.
+    """
+    errors = [{} for _ in items]
+    appointments = _build_appointments(user, items, errors)
+    appointment_conflicts(appointments, errors)
+    _raise_if_errors(errors)
+
+    appointments = _write(user, lambda: Appointment.objects.bulk_create(appointments))
+    refresh_after_commit(affected_days(appointments))
+    return appointments
+
+
+def update_appointments(user, items):
+    """
+    Validate and apply a batch of partial appointment updates with a single bulk_update.
+    """
+    errors = [{} for _ in items]
+    for index, item in enumerate(items):
+        if 'id' not in item:
+            errors[index]['id'] = ["This field is required."]
+
+    ids = [item['id'] for item in items if 'id' in item]
+    instances = Appointment.objects.filter(user=user).select_related('service', 'employee').in_bulk(ids)
+    for index, item in enumerate(items):
+        if 'id' in item and item['id'] not in instances:
+            errors[index]['id'] = [f"Invalid pk \"{item['id']}\" - object does not exist."]
+    if len(set(ids)) != len(ids):
+        raise ValidationError("Each appointment can appear only once in a batch.")
+
+    appointments = _build_appointments(user, items, errors, instances=instances)
+    appointment_conflicts(appointments, errors, exclude_ids=ids)
+    _raise_if_errors(errors)
+
+    now = timezone.now()
+    for appointment in appointments:
+        appointment.updated_at = now  # bulk_update bypasses auto_now
+    _write(user, lambda: Appointment.objects.bulk_update(appointments, APPOINTMENT_FIELDS))
+    refresh_after_commit(affected_days(appointments))
+    return appointments
+
+
+def delete_appointments(user, ids):
+    """
+    Delete the user's appointments with the given ids, failing if any of them does not exist.
+    """
+    return _delete(user, Appointment.objects.filter(user=user), ids)
+
+
+def _delete(user, queryset, ids):
+    ids = set(ids)
+    with transaction.atomic():
+        found = set(queryset.filter(pk__in=ids).select_for_update().values_list('pk', flat=True))
+        missing = sorted(ids - found)
+        if missing:
+            raise ValidationError({'ids': [f"Invalid pk \"{pk}\" - object does not exist." for pk in missing]})
+        queryset.filter(pk__in=found).delete()
+        touch(user.pk, queryset.model)
+    return len(found)
+
+
+def _schedule_conflicts(schedules, errors, exclude_ids=()):
+    """
+    Check the batch against the employees' existing schedules and against itself, using a
+    single query, and record overlap errors on the offending items.
+    """
+    timed = [
+        (index, schedule) for index, schedule in enumerate(schedules)
+        if schedule is not None and schedule.start_time and schedule.end_time
+    ]
+    if not timed:
+        return
+
+    existing = (
+        WorkSchedule.objects.filter(employee_id__in={schedule.employee_id for _, schedule in timed})
+        .exclude(pk__in=exclude_ids)
+        .filter(start_time__isnull=False, end_time__isnull=False)
+        .only('id', 'employee_id', 'day_of_week', 'start_time', 'end_time')
+    )
+
+    intervals = defaultdict(list)
+    for row in existing:
+        intervals[row.employee_id, row.day_of_week].append((row.start_time, row.end_time, (False, row)))
+    for index, schedule in timed:
+        intervals[schedule.employee_id, schedule.day_of_week].append(
+            (schedule.start_time, schedule.end_time, (True, index))
+        )
+
+    for day_intervals in intervals.values():
+        for (later_is_new, later), (earlier_is_new, earlier) in overlapping_pairs(day_intervals):
+            if later_is_new:
+                index = later
+            elif earlier_is_new:
+                index = earlier
+            else:
+                continue
+            errors[index].setdefault('non_field_errors', []).append(
+                "This employee's schedule overlaps with an existing entry."
+            )
+
+
+def _build_schedules(user, items, errors, instances=None):
+    employees = _resolve(Employee, user, [item['employee'] for item in items if 'employee' in item],
+                         'employee', items, errors)
+
+    schedules = []
+    for index, item in enumerate(items):
+        schedule = WorkSchedule(user=user) if instances is None else instances.get(item.get('id'))
+        if errors[index] or schedule is None:
+            schedules.append(None)
+            continue
+
+        if 'employee' in item:
+            schedule.employee = employees[item['employee']]
+        for field in ('day_of_week', 'start_time', 'end_time'):
+            if field in item:
+                setattr(schedule, field, item[field])
+
+        if schedule.start_time and schedule.end_time and schedule.start_time >= schedule.end_time:
+            errors[index].setdefault('non_field_errors', []).append("End time must be after start time.")
+        schedules.append(schedule)
+    return schedules
+
+
+def _refresh_schedule_occupancy(schedules):
+    # An update may have moved rows to another day, so recompute every weekday of the employees
+    for employee_id in {schedule.employee_id for schedule in schedules}:
+        refresh_weekdays(employee_id, set(range(7)))
+
+
+def create_work_schedules(user, items):
+    """
+    Validate and insert a batch of work schedule rows with a single bulk_create.
+    """
+    errors = [{} for _ in items]
+    schedules = _build_schedules(user, items, errors)
+    _schedule_conflicts(schedules, errors)
+    _raise_if_errors(errors)
+
+    with transaction.atomic():
+        schedules = WorkSchedule.objects.bulk_create(schedules)
+        # bulk_create sends no post_save, so record the change here
+        touch(user.pk, WorkSchedule)
+    bump_version(user.pk, REFERENCE_DATA)
+    _refresh_schedule_occupancy(schedules)
+    return schedules
+
+
+def update_work_schedules(user, items):
+    """
+    Validate and apply a batch of partial work schedule updates with a single bulk_update.
+    """
+    errors = [{} for _ in items]
+    for index, item in enumerate(items):
+        if 'id' not in item:
+            errors[index]['id'] = ["This field is required."]
+
+    ids = [item['id'] for item in items if 'id' in item]
+    instances = WorkSchedule.objects.filter(user=user).in_bulk(ids)
+    for index, item in enumerate(items):
+        if 'id' in item and item['id'] not in instances:
+            errors[index]['id'] = [f"Invalid pk \"{item['id']}\" - object does not exist."]
+    if len(set(ids)) != len(ids):
+        raise ValidationError("Each work schedule can appear only once in a batch.")
+
+    schedules = _build_schedules(user, items, errors, instances=instances)
+    _schedule_conflicts(schedules, errors, exclude_ids=ids)
+    _raise_if_errors(errors)
+
+    with transaction.atomic():
+        WorkSchedule.objects.bulk_update(schedules, WORK_SCHEDULE_FIELDS)
+        touch(user.pk, WorkSchedule)
+    bump_version(user.pk, REFERENCE_DATA)
+    _refresh_schedule_occupancy(schedules)
+    return schedules
+
+
+def replace_week(user, employee_id, days):
+    """
+    Replace the whole weekly schedule of an employee: validate every day against the others in
+    memory, then swap the rows in one transaction.
+    """
+    employee = Employee.objects.filter(user=user, pk=employee_id).first()
+    if employee is None:
+        raise ValidationError({'employee': [f"Invalid pk \"{employee_id}\" - object does not exist."]})
+
+    errors = [{} for _ in days]
+    schedules = [WorkSchedule(user=user, employee=employee, **day) for day in days]
+    timed = defaultdict(list)
+    for index, schedule in enumerate(schedules):
+        if schedule.start_time and schedule.end_time:
+            timed[schedule.day_of_week].append((schedule.start_time, schedule.end_time, index))
+    for day_intervals in timed.values():
+        for index, _ in overlapping_pairs(day_intervals):
+            errors[index].setdefault('non_field_errors', []).append(
+                "This entry overlaps with another entry of the same day."
+            )
+    if any(errors):
+        raise ValidationError({'days': errors})
+
+    with transaction.atomic():
+        WorkSchedule.objects.filter(employee=employee).delete()
+        schedules = WorkSchedule.objects.bulk_create(schedules)
+        touch(user.pk, WorkSchedule)
+    bump_version(user.pk, REFERENCE_DATA)
+    refresh_weekdays(employee.id, set(range(7)))
+    return schedules
+
+
+def delete_work_schedules(user, ids):
+    """
+    Delete the user's work schedules with the given ids, failing if any of them does not exist.
+    """
+    return _delete(user, WorkSchedule.objects.filter(user=user), ids)
@@ -0,0 +1,109 @@
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from unify.cache import is_shared_cache
+
+# Services, categories and employees (with their work schedules) share one version per tenant,
+# since the category list embeds services and employees
+REFERENCE_DATA = 'reference'
+
+STATS_KEY = 'services:cache-stats:{outcome}:{name}'
+
+
+def get_cache():
+    return caches[settings.SERVICES_CACHE_ALIAS]
+
+
+def _version_key(user_id, namespace):
+    return f'tenant:{user_id}:{namespace}:version'
+
+
+def get_version(user_id, namespace):
+    """
+    Return the tenant's current version of `namespace`, starting one if the cache has none.
+    """
+    cache = get_cache()
+    version = cache.get(_version_key(user_id, namespace))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(_version_key(user_id, namespace), version, timeout=None):
+            version = cache.get(_version_key(user_id, namespace), version)
+    return version
+
+
+def _set_version(user_id, namespace):
+    get_cache().set(_version_key(user_id, namespace), time.time_ns(), timeout=None)
+
+
+def bump_version(user_id, namespace):
+    """
+    Invalidate everything cached for the tenant under `namespace` once the current transaction
+    commits; bumping earlier would let a concurrent request cache the old rows under the new version.
+    """
+    if user_id is not None and is_shared_cache(settings.SERVICES_CACHE_ALIAS):
+        transaction.on_commit(partial(_set_version, user_id, namespace))
+
+
+def record(outcome, name):
+    cache = get_cache()
+    key = STATS_KEY.format(outcome=outcome, name=name)
+    try:
+        # Atomic on Redis and Memcached, and keeps the counter's timeout
+        cache.incr(key)
+    except ValueError:
+        # First count, or evicted; a concurrent first count may be lost
+        cache.add(key, 1, timeout=None)
+
+
+def stats(names):
+    """
+    Return the hit and miss counters of each cached list.
+    """
+    cache = get_cache()
+    return {
+        name: {
+            outcome: cache.get(STATS_KEY.format(outcome=outcome, name=name), 0)
+            for outcome in ('hits', 'misses')
+        }
+        for name in names
+    }
+
+
+class CachedListMixin:
+    """
+    Caches the list response per tenant and query string. Entries are keyed by the tenant's
+    version of `cache_namespace`, which the signals in services.signals bump on every change,
+    so stale entries are never served and simply expire.
+
+    Only active with Redis or Memcached (see unify.cache.is_shared_cache); otherwise the list is
+    read from the database as usual.
+    """
+    cache_namespace = REFERENCE_DATA
+
+    def list(self, request, *args, **kwargs):
+        if not is_shared_cache(settings.SERVICES_CACHE_ALIAS):
+            return super().list(request, *args, **kwargs)
+
+        user_id = request.user.pk
+        path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+        key = f'tenant:{user_id}:{self.cache_namespace}:{get_version(user_id, self.cache_namespace)}:' \
+              f'{self.basename}:{path}'
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            record('hits', self.basename)
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=settings.SERVICES_CACHE_TIMEOUT)
+        record('misses', self.basename)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,94 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import TenantChange
+
+
+def touch(user_id, *models):
+    """
+    Record a change to the tenant's rows of `models`. The counters are written in the caller's
+    transaction, so every worker sees them exactly when it sees the change itself.
+    """
+    if user_id is None:
+        return
+    now = timezone.now()
+    for model in models:
+        changes = TenantChange.objects.filter(user_id=user_id, model=model._meta.model_name)
+        if changes.update(version=F('version') + 1, changed_at=now):
+            continue
+        try:
+            with transaction.atomic():
+                TenantChange.objects.create(user_id=user_id, model=model._meta.model_name, version=1, changed_at=now)
+        except IntegrityError:
+            # Another write created the counter in the meantime
+            changes.update(version=F('version') + 1, changed_at=now)
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified to list and retrieve responses and answers 304 Not Modified,
+    without touching the serializer, when the client's copy is current.
+
+    Both validators come from the tenant's change counters of `etag_models` (see touch) and from
+    `last_modified_field` of the viewset's model: its newest value on list, read from a
+    (user, last_modified_field) index, and the object's value on retrieve. The latter also catch
+    writes that send no signal; deletions always go through touch.
+    """
+    etag_models = ()
+    last_modified_field = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    def validators(self, request, **kwargs):
+        """
+        Return the versions the response depends on and the time of the latest change.
+        """
+        changes = TenantChange.objects.filter(
+            user_id=request.user.pk, model__in=[model._meta.model_name for model in self.etag_models],
+        ).order_by('model').values_list('model', 'version', 'changed_at')
+        versions = [(model, version) for model, version, _ in changes]
+        changed = [changed_at for *_, changed_at in changes]
+
+        if self.last_modified_field:
+            queryset = self.get_queryset().model._default_manager.filter(user_id=request.user.pk)
+            if self.action == 'retrieve':
+                latest = queryset.filter(pk=kwargs.get(self.lookup_field)) \
+                    .values_list(self.last_modified_field, flat=True).first()
+            else:
+                latest = queryset.aggregate(latest=Max(self.last_modified_field))['latest']
+            if latest is not None:
+                versions.append(latest.isoformat())
+                changed.append(latest)
+
+        return versions, max(changed, default=None)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        versions, changed = self.validators(request, **kwargs)
+        fingerprint = f'{self.basename}:{request.user.pk}:{request.get_full_path()}:{versions}'
+        etag = f'"{hashlib.md5(fingerprint.encode("utf-8")).hexdigest()}"'
+        last_modified = int(changed.timestamp()) if changed is not None else None
+
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response['ETag'] = etag
+        # Last-Modified has whole seconds: a later change in the same second, or one committed late
+        # with an earlier timestamp, would keep it unchanged. So it is only sent once that is over.
+        if last_modified is not None and last_modified + settings.CHANGE_COMMIT_MARGIN < time.time():
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
@@ -0,0 +1,69 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = [
+    ('csv', 'CSV'),
+    ('ndjson', 'Newline delimited JSON'),
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Column name -> values() lookup
+APPOINTMENT_COLUMNS = {
+    'id': 'id',
+    'date': 'date',
+    'end_date': 'end_date',
+    'status': 'status',
+    'client': 'client__name',
+    'client_email': 'client__email',
+    'service': 'service__name',
+    'employee': 'employee__name',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+CLIENT_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'email': 'email',
+}
+
+
+class Echo:
+    """
+    File-like object whose write returns the line instead of buffering it, for csv.writer.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(queryset, columns, export_format, filename):
+    """
+    Stream `queryset` as CSV or NDJSON rows, reading it with a server-side cursor in chunks
+    of EXPORT_CHUNK_SIZE, so memory stays flat however many rows there are.
+    """
+    rows = queryset.values_list(*columns.values()).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    lines = csv_lines if export_format == 'csv' else ndjson_lines
+    response = StreamingHttpResponse(lines(rows, list(columns)), content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,79 @@
+import timeit
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from services.models import Appointment, Client, Employee, Service
+from services.serializers import AppointmentSerializer
+from unify.parsers import FastJSONParser
+from unify.middleware import brotli, compress
+from unify.renderers import FastJSONRenderer, orjson
+
+
+def build_payload(count):
+    """
+    Serialize `count` unsaved appointments, so the benchmark needs no database rows.
+    """
+    user = get_user_model()(email='benchmark@example.com')
+    client = Client(id=1, user=user, name='Benchmark Client', email='client@example.com')
+    service = Service(id=1, user=user, name='Haircut', time=30)
+    employee = Employee(id=1, user=user, name='Benchmark Employee')
+    start = datetime(2024, 1, 1, 9, 0)
+    appointments = [
+        Appointment(
+            id=index, user=user, client=client, service=service, employee=employee,
+            date=start + timedelta(minutes=30 * index), end_date=start + timedelta(minutes=30 * index + 30),
+            status='scheduled', created_at=start, updated_at=start + timedelta(microseconds=index),
+        )
+        for index in range(1, count + 1)
+    ]
+    return AppointmentSerializer(appointments, many=True).data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare render and parse times of the JSON renderers/parsers on a large appointment list, "
+        "and the bandwidth saved by response compression."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=5000, help="Appointments in the payload.")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per renderer (best one is kept).")
+
+    def best(self, callback, repeat):
+        return min(timeit.repeat(callback, number=1, repeat=repeat)) * 1000
+
+    def handle(self, *args, **options):
+        data = build_payload(options['count'])
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed: FastJSONRenderer uses the stdlib encoder."))
+
+        body = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != body:
+            self.stdout.write(self.style.WARNING("The renderers produce different output for this payload."))
+        self.stdout.write(f"{options['count']} appointments, {len(body) / 1024:.0f} KiB of JSON")
+
+        results = [
+            ('render', JSONRenderer().render, FastJSONRenderer().render, data),
+            ('parse', lambda payload: JSONParser().parse(BytesIO(payload)),
+             lambda payload: FastJSONParser().parse(BytesIO(payload)), body),
+        ]
+        for name, baseline, fast, payload in results:
+            baseline_ms = self.best(lambda: baseline(payload), options['repeat'])
+            fast_ms = self.best(lambda: fast(payload), options['repeat'])
+            self.stdout.write(
+                f"{name:>6}: DRF {baseline_ms:8.2f} ms   fast {fast_ms:8.2f} ms   {baseline_ms / fast_ms:5.1f}x"
+            )
+
+        self.stdout.write("Compression (COMPRESSION_BROTLI_QUALITY for br):")
+        for encoding in ['gzip', 'br'] if brotli is not None else ['gzip']:
+            compressed = compress(body, encoding)
+            elapsed = self.best(lambda: compress(body, encoding), options['repeat'])
+            self.stdout.write(
+                f"{encoding:>6}: {len(compressed) / 1024:8.0f} KiB   {100 * (1 - len(compressed) / len(body)):5.1f}% saved"
+                f"   {elapsed:8.2f} ms"
+            )
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+from rest_framework.viewsets import GenericViewSet
+
+from unify.urls import router
+from users.models import CustomUser
+
+
+def sequential_scans(plan):
+    """
+    Return the plan lines that read a whole table instead of probing an index.
+    """
+    if connection.vendor == 'postgresql':
+        return [line.strip() for line in plan.splitlines() if 'Seq Scan' in line]
+    if connection.vendor == 'sqlite':
+        # SQLite reports "SCAN table" for full scans and "SEARCH table USING INDEX" for probes
+        return [line.strip() for line in plan.splitlines() if line.split('--')[-1].strip().startswith('SCAN')]
+    return []
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on the list queryset of every API viewset and report sequential scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help="Email of the tenant whose querysets are explained (defaults to the first user).",
+        )
+        parser.add_argument(
+            '--no-seqscan',
+            action='store_true',
+            help="PostgreSQL only: disable sequential scans for the session, so small development "
+                 "tables still show whether an index can serve the query.",
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help="Print the full plan of every queryset.",
+        )
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            help="Exit with an error if any sequential scan is found.",
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = CustomUser.objects.filter(email=options['user']).first()
+        else:
+            user = CustomUser.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError("No user found to explain the querysets for.")
+
+        if options['no_seqscan'] and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+        factory = RequestFactory()
+        offenders = 0
+        for prefix, viewset, basename in router.registry:
+            if not issubclass(viewset, GenericViewSet):
+                continue
+
+            request = Request(factory.get(f'/api/{prefix}/'))
+            request.user = user
+            view = viewset(request=request, args=(), kwargs={}, action='list', format_kwarg=None)
+            queryset = view.filter_queryset(view.get_queryset())
+
+            plan = queryset.explain()
+            scans = sequential_scans(plan)
+
+            if scans:
+                offenders += 1
+                self.stdout.write(self.style.WARNING(f"{basename}: sequential scan"))
+                for line in scans:
+                    self.stdout.write(f"    {line}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{basename}: no sequential scan"))
+
+            if options['plans']:
+                self.stdout.write(plan)
+
+        if offenders and options['fail']:
+            raise CommandError(f"{offenders} viewset(s) use sequential scans.")
@@ -0,0 +1,198 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+
+from services.bulk import appointment_conflicts
+from services.conditional import touch
+from services.models import Appointment, Client, Employee, Service, APPOINTMENT_STATUS
+from services.occupancy import affected_days, refresh_days
+
+STATUSES = {key for key, _ in APPOINTMENT_STATUS}
+
+
+def read_records(path, input_format):
+    """
+    Yield the records of a CSV file (with a header row) or an NDJSON file one at a time.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        if input_format == 'csv':
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def chunks(records, size):
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Import clients or appointments for a user from CSV or NDJSON, in the columns written by "
+        "the export endpoints. Rows that are invalid, reference unknown records, would double-book "
+        "an employee or match another account's client are skipped and reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['clients', 'appointments'])
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help="Email of the user who owns the records.")
+        parser.add_argument('--format', dest='input_format', choices=['csv', 'ndjson'],
+                            help="Input format (defaults to the file extension).")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Records read and inserted per batch.")
+
+    def handle(self, *args, **options):
+        try:
+            self.user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}.")
+        input_format = options['input_format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+        model = Client if options['kind'] == 'clients' else Appointment
+        import_chunk = self.import_clients if model is Client else self.import_appointments
+        if model is Appointment:
+            self.load_lookups()
+
+        self.verbosity = options['verbosity']
+        self.created = self.skipped = self.present = self.foreign = 0
+        self.days = defaultdict(set)
+        started = time.monotonic()
+        read = 0
+        try:
+            for chunk in chunks(read_records(options['path'], input_format), options['chunk_size']):
+                with transaction.atomic():
+                    import_chunk(chunk, read)
+                read += len(chunk)
+                if self.verbosity > 1:
+                    self.stdout.write(f"{read} record(s) read")
+        except (OSError, ValueError, csv.Error) as error:
+            # The chunks imported so far stay, so they are still recorded
+            self.record_changes(model)
+            raise CommandError(f"Could not read {options['path']} after {read} record(s): {error}")
+        except IntegrityError as error:
+            self.record_changes(model)
+            raise CommandError(
+                f"Records {read + 1} to {read + len(chunk)} clash with records written meanwhile, "
+                f"run the import again to add them: {error}"
+            )
+
+        self.record_changes(model)
+        elapsed = time.monotonic() - started
+        foreign = f" ({self.foreign} owned by another account)" if self.foreign else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {read} record(s), created {self.created}, skipped {self.skipped}{foreign}, already present "
+            f"{self.present} in {elapsed:.1f}s ({read / elapsed if elapsed else 0:.0f} records/s)."
+        ))
+
+    def record_changes(self, model):
+        # bulk_create sends no post_save, so record the change here
+        touch(self.user.pk, model)
+        for employee_id, days in self.days.items():
+            refresh_days(employee_id, days)
+
+    def skip(self, line, reason):
+        self.skipped += 1
+        if self.verbosity > 0:
+            self.stderr.write(f"Record {line}: {reason}")
+
+    def import_clients(self, records, offset):
+        lines = {}
+        for line, record in enumerate(records, start=offset + 1):
+            name, email = (record.get('name') or '').strip(), (record.get('email') or '').strip()
+            if not name or not email:
+                self.skip(line, "name and email are required.")
+            else:
+                # Client.save title-cases the name, bulk_create bypasses it
+                key = (name.title(), email)
+                if key in lines:
+                    self.present += 1
+                else:
+                    lines[key] = line
+        if not lines:
+            return
+
+        # (name, email) is unique across all users, so look the pairs up whoever owns them:
+        # the user's own clients are left as they are, other users' are reported
+        owners = {
+            (name, email): user_id
+            for name, email, user_id in Client.objects.filter(
+                name__in={name for name, _ in lines}, email__in={email for _, email in lines},
+            ).values_list('name', 'email', 'user_id')
+        }
+        clients = []
+        for (name, email), line in lines.items():
+            owner = owners.get((name, email))
+            if owner is None:
+                clients.append(Client(user=self.user, name=name, email=email))
+            elif owner == self.user.pk:
+                self.present += 1
+            else:
+                self.foreign += 1
+                self.skip(line, f"a client named {name} with email {email} belongs to another account.")
+        Client.objects.bulk_create(clients)
+        self.created += len(clients)
+
+    def load_lookups(self):
+        """
+        Load the user's clients, services and employees once, keyed by the exported columns.
+        """
+        self.clients = {
+            (name, email): pk
+            for pk, name, email in Client.objects.filter(user=self.user).values_list('id', 'name', 'email')
+        }
+        self.services = {
+            service.name: service for service in Service.objects.filter(user=self.user).only('id', 'name', 'time')
+        }
+        self.employees = {
+            employee.name: employee for employee in Employee.objects.filter(user=self.user).only('id', 'name')
+        }
+
+    def import_appointments(self, records, offset):
+        appointments, lines = [], []
+        for line, record in enumerate(records, start=offset + 1):
+            client_key = ((record.get('client') or '').strip().title(), (record.get('client_email') or '').strip())
+            client = self.clients.get(client_key)
+            service = self.services.get(record.get('service'))
+            employee = self.employees.get(record.get('employee'))
+            try:
+                date = parse_datetime(record.get('date') or '')
+            except (TypeError, ValueError):  # not a string, or out of range like 2030-02-30T11:00:00
+                date = None
+            status = record.get('status') or 'scheduled'
+
+            if client is None or service is None or employee is None:
+                self.skip(line, "unknown client, service or employee.")
+            elif date is None:
+                self.skip(line, "date is missing or invalid.")
+            elif status not in STATUSES:
+                self.skip(line, f"unknown status {status}.")
+            else:
+                appointments.append(Appointment(
+                    user=self.user, client_id=client, service=service, employee=employee, date=date,
+                    # Appointment.save computes end_date, bulk_create bypasses it
+                    end_date=date + timedelta(minutes=service.time), status=status,
+                ))
+                lines.append(line)
+
+        errors = [{} for _ in appointments]
+        appointment_conflicts(appointments, errors)
+        for line, error in zip(lines, errors):
+            if error:
+                self.skip(line, ' '.join(message for messages in error.values() for message in messages))
+        appointments = [appointment for appointment, error in zip(appointments, errors) if not error]
+
+        # appointment_conflicts already skipped duplicates and overlaps, anything left clashes with a concurrent write
+        Appointment.objects.bulk_create(appointments)
+        self.created += len(appointments)
+        for employee_id, days in affected_days(appointments).items():
+            self.days[employee_id] |= days
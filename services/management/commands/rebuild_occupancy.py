@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from services.models import Appointment, AppointmentSeries, Employee
+from services.occupancy import rebuild
+from services.recurrence import VALIDATION_HORIZON, last_end
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily occupancy table from appointments, work schedules and leave days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild the employees of the user with this email.")
+        parser.add_argument('--employee', type=int, help="Only rebuild this employee.")
+        parser.add_argument('--date-from', type=date.fromisoformat,
+                            help="First day to rebuild (defaults to the employee's first booking).")
+        parser.add_argument('--date-to', type=date.fromisoformat,
+                            help="Last day to rebuild (defaults to the employee's last booking; open-ended "
+                                 "series count up to a year ahead).")
+
+    def handle(self, *args, **options):
+        employees = Employee.objects.only('id', 'user_id', 'name').order_by('pk')
+        if options['user']:
+            employees = employees.filter(user__email=options['user'])
+        if options['employee']:
+            employees = employees.filter(pk=options['employee'])
+
+        total = 0
+        for employee in employees.iterator():
+            date_from, date_to = options['date_from'], options['date_to']
+            if date_from is None or date_to is None:
+                bounds = self.booking_bounds(employee)
+                if bounds is None:
+                    continue
+                date_from = date_from or bounds[0].date()
+                date_to = date_to or bounds[1].date()
+            if date_to < date_from:
+                raise CommandError("--date-to must not be before --date-from.")
+
+            days = rebuild(employee, date_from, date_to)
+            total += days
+            self.stdout.write(f"{employee.name}: {days} booked day(s) between {date_from} and {date_to}")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} occupancy row(s)."))
+
+    def booking_bounds(self, employee):
+        """
+        First start and last end of the employee's appointments and series occurrences, or None.
+        """
+        bounds = Appointment.objects.filter(employee=employee).aggregate(first=Min('date'), last=Max('end_date'))
+        starts = [bounds['first']] if bounds['first'] else []
+        ends = [bounds['last'] or bounds['first']] if bounds['first'] else []
+
+        horizon = timezone.now() + VALIDATION_HORIZON
+        series_list = AppointmentSeries.objects.filter(employee=employee).exclude(status='cancelled') \
+            .select_related('service').prefetch_related('exceptions')
+        for series in series_list:
+            starts.append(series.start)
+            ends.append(max(min(last_end(series) or horizon, horizon), series.start))
+            for exception in series.exceptions.all():
+                if exception.new_date and not exception.cancelled:
+                    starts.append(exception.new_date)
+                    ends.append(exception.new_date + timedelta(minutes=series.service.time))
+
+        if not starts:
+            return None
+        return min(starts), max(ends)
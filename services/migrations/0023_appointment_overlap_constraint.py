@@ -0,0 +1,38 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def add_overlap_constraint(apps, schema_editor):
+    # Exclusion constraints need PostgreSQL; other backends rely on the composite index above
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        "ALTER TABLE services_appointment ADD CONSTRAINT appointment_no_overlap "
+        "EXCLUDE USING gist (employee_id WITH =, tsrange(date, end_date, '[)') WITH &&) "
+        "WHERE (date IS NOT NULL AND end_date IS NOT NULL AND status <> 'cancelled')"
+    )
+
+
+def remove_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE services_appointment DROP CONSTRAINT IF EXISTS appointment_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0022_alter_workschedule_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['employee', 'date', 'end_date'], name='appointment_employee_range_idx'),
+        ),
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
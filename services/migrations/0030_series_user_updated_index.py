@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0029_tenant_change'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointmentseries',
+            index=models.Index(fields=['user', 'updated_at'], name='series_user_updated_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from unify import settings
 from users.models import CustomUser
@@ -47,6 +48,9 @@ class Service(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['user', 'name'], name='service_user_name_idx'),
+        ]
 
     constraints = [
         models.UniqueConstraint(fields=['service_category', 'name'], name='unique_service_within_category')
@@ -67,6 +71,9 @@ class Employee(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['user', 'name'], name='employee_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -97,6 +104,10 @@ class WorkSchedule(models.Model):
     class Meta:
         # Folosim day_of_week pentru ordonare
         ordering = ['employee', 'day_of_week']
+        indexes = [
+            models.Index(fields=['user', 'employee', 'day_of_week'], name='workschedule_user_employee_idx'),
+            models.Index(fields=['employee', 'day_of_week'], name='workschedule_employee_day_idx'),
+        ]
 
     def __str__(self):
         start = self.start_time if self.start_time else "Not set"
@@ -124,6 +135,9 @@ class Client(models.Model):
     class Meta:
         unique_together = ('name', 'email')
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['user', 'name'], name='client_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -134,6 +148,9 @@ class Client(models.Model):
         super().save(*args, **kwargs)
 
 
+# PostgreSQL exclusion constraint (see migration 0023) rejecting overlapping bookings per employee
+APPOINTMENT_OVERLAP_CONSTRAINT = 'appointment_no_overlap'
+
 APPOINTMENT_STATUS = [
     ('scheduled', 'Scheduled'),
     ('confirmed', 'Confirmed'),
@@ -142,6 +159,25 @@ APPOINTMENT_STATUS = [
 ]
 
 
+class AppointmentQuerySet(models.QuerySet):
+    def blocking(self):
+        """
+        Appointments that occupy the employee's time; cancelled ones free the slot.
+        """
+        return self.exclude(status='cancelled')
+
+    def overlapping(self, start, end):
+        """
+        Appointments intersecting the half-open interval [start, end).
+        """
+        return self.filter(date__lt=end, end_date__gt=start)
+
+    def update(self, **kwargs):
+        # auto_now only applies on save(); the ETags and the changes feed read updated_at
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
+
 class Appointment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     client = models.ForeignKey('Client', on_delete=models.CASCADE, related_name='appointments')
@@ -153,13 +189,28 @@ class Appointment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, choices=APPOINTMENT_STATUS, default='scheduled')
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         unique_together = ('client', 'service', 'employee', 'date')
         ordering = ['date']
+        indexes = [
+            models.Index(fields=['employee', 'date', 'end_date'], name='appointment_employee_range_idx'),
+            models.Index(fields=['user', 'date'], name='appointment_user_date_idx'),
+            models.Index(fields=['user', 'status', 'date'], name='appointment_user_status_idx'),
+            models.Index(fields=['user', 'updated_at'], name='appointment_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.client.name} - {self.service.name} with {self.employee.name} on {self.date}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Păstrăm valorile încărcate, ca la modificare să putem recalcula și zilele vechi
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
         # Automatically set end_date based on service duration
         if self.date and self.service:
@@ -168,3 +219,145 @@ class Appointment(models.Model):
         # Run the clean method to validate data
         self.clean()
         super(Appointment, self).save(*args, **kwargs)
+
+
+RECURRENCE_FREQUENCY = [
+    ('daily', 'Daily'),
+    ('weekly', 'Weekly'),
+]
+
+
+class AppointmentSeries(models.Model):
+    """
+    A standing booking stored once; occurrences are expanded on demand by services.recurrence.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    client = models.ForeignKey('Client', on_delete=models.CASCADE, related_name='appointment_series')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, related_name='appointment_series')
+    employee = models.ForeignKey('Employee', on_delete=models.CASCADE, related_name='appointment_series')
+    start = models.DateTimeField(help_text="Start of the first occurrence.")
+    frequency = models.CharField(max_length=10, choices=RECURRENCE_FREQUENCY, default='weekly')
+    interval = models.PositiveIntegerField(default=1, help_text="Repeat every this many days or weeks.")
+    until = models.DateField(null=True, blank=True, help_text="Last day an occurrence may fall on.")
+    count = models.PositiveIntegerField(null=True, blank=True, help_text="Maximum number of occurrences.")
+    status = models.CharField(max_length=20, choices=APPOINTMENT_STATUS, default='scheduled')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['start']
+        indexes = [
+            models.Index(fields=['employee', 'start'], name='series_employee_start_idx'),
+            models.Index(fields=['user', 'start'], name='series_user_start_idx'),
+            models.Index(fields=['user', 'updated_at'], name='series_user_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.client.name} - {self.service.name} with {self.employee.name} {self.frequency} from {self.start}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Ca la Appointment: la mutarea pe alt angajat recalculăm și gradul de ocupare al celui vechi
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class AppointmentSeriesException(models.Model):
+    """
+    One occurrence of a series that was moved to `new_date` or cancelled.
+    """
+    series = models.ForeignKey('AppointmentSeries', on_delete=models.CASCADE, related_name='exceptions')
+    original_date = models.DateTimeField()
+    new_date = models.DateTimeField(null=True, blank=True)
+    cancelled = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['original_date']
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'original_date'], name='unique_exception_per_occurrence')
+        ]
+
+    def __str__(self):
+        change = "cancelled" if self.cancelled else f"moved to {self.new_date}"
+        return f"{self.series_id} on {self.original_date}: {change}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # La o nouă mutare recalculăm și ziua pe care fusese mutată ocurența
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class AppointmentDeletion(models.Model):
+    """
+    Tombstone of a deleted appointment, so sync clients can learn about deletions.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    appointment_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='deletion_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Appointment {self.appointment_id} deleted on {self.deleted_at}"
+
+
+class EmployeeDayOccupancy(models.Model):
+    """
+    Booked versus scheduled minutes of an employee on one day, kept up to date by services.occupancy.
+    Only days with at least one booking have a row.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    employee = models.ForeignKey('Employee', on_delete=models.CASCADE, related_name='occupancy')
+    date = models.DateField()
+    scheduled_minutes = models.PositiveIntegerField(default=0)
+    booked_minutes = models.PositiveIntegerField(default=0)
+    appointment_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date', 'employee']
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'date'], name='unique_occupancy_per_employee_day')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'], name='occupancy_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} on {self.date}: {self.booked_minutes}/{self.scheduled_minutes} min"
+
+    @property
+    def utilization(self):
+        if not self.scheduled_minutes:
+            return None
+        return round(self.booked_minutes / self.scheduled_minutes, 4)
+
+    @property
+    def is_fully_booked(self):
+        return self.scheduled_minutes > 0 and self.booked_minutes >= self.scheduled_minutes
+
+
+class TenantChange(models.Model):
+    """
+    Per-tenant change counter of a model, incremented in the writer's transaction by
+    services.conditional.touch. The ETag and Last-Modified headers of the API are built from it.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    model = models.CharField(max_length=100)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model'], name='unique_change_per_tenant_model')
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.model}: version {self.version} on {self.changed_at}"
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import chain
+
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import daterange, merge_intervals, window_bounds
+from .models import Appointment, Employee, EmployeeDayOccupancy, LeaveDay, WorkSchedule
+from .recurrence import VALIDATION_HORIZON, expand, series_busy
+
+OCCUPANCY_FIELDS = ['user', 'scheduled_minutes', 'booked_minutes', 'appointment_count', 'updated_at']
+BATCH_SIZE = 1000
+
+
+def _minutes(delta):
+    return max(int(delta.total_seconds() // 60), 0)
+
+
+def appointment_days(start, end):
+    """
+    Return the dates an appointment touches; most appointments touch exactly one.
+    """
+    if start is None:
+        return []
+    if end is None or end <= start:
+        return [start.date()]
+    return list(daterange(start.date(), (end - timedelta(microseconds=1)).date()))
+
+
+def scheduled_minutes(schedules, day, leave_dates):
+    """
+    Minutes the employee works on `day` according to the weekly schedule.
+    """
+    if day in leave_dates:
+        return 0
+    intervals = sorted(
+        (schedule.start_time, schedule.end_time) for schedule in schedules
+        if schedule.day_of_week == day.weekday()
+        and schedule.start_time and schedule.end_time and schedule.start_time < schedule.end_time
+    )
+    return sum(
+        _minutes(datetime.combine(day, end) - datetime.combine(day, start))
+        for start, end in merge_intervals(intervals)
+    )
+
+
+def build_rows(employee, days, schedules, leave_dates, appointments):
+    """
+    Build the occupancy rows of `employee` for the booked days among `days`, from its schedules,
+    leave days and (start, end) pairs of blocking appointments and series occurrences.
+    """
+    booked = defaultdict(int)
+    counts = defaultdict(int)
+    for start, end in appointments:
+        for day in appointment_days(start, end):
+            day_start, day_end = window_bounds(day, day)
+            booked[day] += _minutes(min(end or start, day_end) - max(start, day_start))
+            counts[day] += 1
+
+    return [
+        EmployeeDayOccupancy(
+            user_id=employee.user_id,
+            employee_id=employee.id,
+            date=day,
+            scheduled_minutes=scheduled_minutes(schedules, day, leave_dates),
+            booked_minutes=booked[day],
+            appointment_count=counts[day],
+        )
+        for day in days if counts[day]
+    ]
+
+
+def _load(employee, date_from, date_to):
+    window_start, window_end = window_bounds(date_from, date_to)
+    schedules = list(WorkSchedule.objects.filter(employee=employee))
+    leave_dates = set(
+        LeaveDay.objects.filter(employee=employee, date__range=(date_from, date_to))
+        .values_list('date', flat=True)
+    )
+    appointments = (
+        Appointment.objects.filter(employee=employee)
+        .blocking()
+        .overlapping(window_start, window_end)
+        .values_list('date', 'end_date')
+    )
+    occurrences = series_busy([employee.id], window_start, window_end).get(employee.id, [])
+    bookings = chain(
+        appointments.iterator(chunk_size=BATCH_SIZE),
+        ((occurrence.date, occurrence.end_date) for occurrence in occurrences),
+    )
+    return schedules, leave_dates, bookings
+
+
+def _save(employee, days, rows):
+    booked_days = {row.date for row in rows}
+    with transaction.atomic():
+        EmployeeDayOccupancy.objects.bulk_create(
+            rows,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['employee', 'date'],
+            update_fields=OCCUPANCY_FIELDS,
+        )
+        # Days left without bookings lose their row
+        EmployeeDayOccupancy.objects.filter(employee=employee, date__in=set(days) - booked_days).delete()
+
+
+def refresh_days(employee_id, days):
+    """
+    Recompute the occupancy of the given days of an employee from the source tables.
+    """
+    days = sorted(set(days))
+    employee = Employee.objects.filter(pk=employee_id).only('id', 'user_id').first()
+    if employee is None or not days:
+        return  # deleted meanwhile, its rows went with it
+
+    schedules, leave_dates, bookings = _load(employee, days[0], days[-1])
+    _save(employee, days, build_rows(employee, days, schedules, leave_dates, bookings))
+
+
+def refresh_weekdays(employee_id, weekdays):
+    """
+    Recompute the stored days, from today on, falling on the given weekdays (0 = Monday) after
+    the employee's schedule changed. Past days keep the schedule they were booked against.
+    """
+    days = [
+        day for day in EmployeeDayOccupancy.objects.filter(
+            employee_id=employee_id, date__gte=timezone.now().date()
+        ).values_list('date', flat=True)
+        if day.weekday() in weekdays
+    ]
+    refresh_days(employee_id, days)
+
+
+def rebuild(employee, date_from, date_to):
+    """
+    Recompute every day of the range for the employee, e.g. for backfills. Returns the number of booked days.
+    """
+    days = list(daterange(date_from, date_to))
+    schedules, leave_dates, bookings = _load(employee, date_from, date_to)
+    rows = build_rows(employee, days, schedules, leave_dates, bookings)
+
+    with transaction.atomic():
+        EmployeeDayOccupancy.objects.filter(employee=employee, date__range=(date_from, date_to)).delete()
+        EmployeeDayOccupancy.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def refresh_series(series, employee_ids):
+    """
+    Recompute, from today over the validation horizon, the days the series occupies and the days
+    already stored for the employees, which covers the occurrences it no longer has.
+    """
+    today = timezone.now().date()
+    days = {
+        day
+        for occurrence in expand(series, *window_bounds(today, today + VALIDATION_HORIZON))
+        for day in appointment_days(occurrence.date, occurrence.end_date)
+    }
+    for employee_id in employee_ids:
+        stored = EmployeeDayOccupancy.objects.filter(employee_id=employee_id, date__gte=today) \
+            .values_list('date', flat=True)
+        refresh_days(employee_id, days | set(stored))
+
+
+def affected_days(appointments):
+    """
+    Map employee id to the days whose occupancy the given (saved or deleted) appointments change,
+    including the days they occupied before being modified.
+    """
+    days = defaultdict(set)
+    for appointment in appointments:
+        days[appointment.employee_id].update(appointment_days(appointment.date, appointment.end_date))
+        loaded = getattr(appointment, '_loaded_values', None)
+        if loaded and loaded.get('employee_id'):
+            days[loaded['employee_id']].update(appointment_days(loaded.get('date'), loaded.get('end_date')))
+    return days
+
+
+def refresh_after_commit(days_by_employee):
+    """
+    Schedule the refresh for after the transaction commits, so rolled back changes cost nothing and
+    cascading deletes of the employee have completed.
+    """
+    for employee_id, days in days_by_employee.items():
+        if days:
+            transaction.on_commit(lambda employee_id=employee_id, days=days: refresh_days(employee_id, days))
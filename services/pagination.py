@@ -0,0 +1,128 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on (ordering_field, id).
+
+    The cursor carries the ordering value and id of the last row of the page, and the next page
+    seeks past it with an indexed range predicate, so page 1000 costs the same as page 1.
+    Rows whose ordering value is NULL come last, ordered by id.
+    """
+    ordering_field = None
+    page_size = 100
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model_field = queryset.model._meta.get_field(self.ordering_field)
+
+        rows = self.seek(queryset, self.decode_cursor(request), self.page_size + 1)
+
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            last = rows[-1]
+            self.next_position = (getattr(last, self.ordering_field), last.pk)
+        return rows
+
+    def seek(self, queryset, position, limit):
+        """
+        Fetch up to `limit` rows following `position`.
+        """
+        field = self.ordering_field
+        if position is None:
+            return list(queryset.order_by(F(field).asc(nulls_last=True), 'pk')[:limit])
+
+        value, pk = position
+        if value is None:
+            return list(queryset.filter(**{f'{field}__isnull': True, 'pk__gt': pk}).order_by('pk')[:limit])
+
+        rows = list(
+            queryset.filter(**{f'{field}__gte': value})
+            .exclude(**{field: value, 'pk__lte': pk})
+            .order_by(field, 'pk')[:limit]
+        )
+        if len(rows) < limit and self.model_field.null:
+            # Past the last non-null value: continue into the NULL tail
+            rows += list(queryset.filter(**{f'{field}__isnull': True}).order_by('pk')[:limit - len(rows)])
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            value, pk = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if value is not None:
+                value = self.model_field.to_python(value)
+            return value, int(pk)
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        value, pk = position
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        encoded = urlsafe_b64encode(json.dumps([value, pk]).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+
+class AppointmentPagination(KeysetPagination):
+    ordering_field = 'date'
+
+
+class AppointmentChangesPagination(KeysetPagination):
+    ordering_field = 'updated_at'
+    page_size = 500
+    max_page_size = 1000
+
+
+class NamePagination(KeysetPagination):
+    ordering_field = 'name'
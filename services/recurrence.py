@@ -0,0 +1,162 @@
+import heapq
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+
+from .models import Appointment, AppointmentSeries
+
+# Occurrences of a new or changed series are checked against existing bookings this far
+# ahead of its start
+VALIDATION_HORIZON = timedelta(days=365)
+
+# Same attribute names as Appointment, so conflicts are reported the same way
+Occurrence = namedtuple('Occurrence', ['date', 'end_date', 'series'])
+
+
+def step(series):
+    if series.frequency == 'daily':
+        return timedelta(days=series.interval)
+    return timedelta(weeks=series.interval)
+
+
+def _regular_starts(series, lower, upper):
+    """
+    Yield the rule's starts in [lower, upper), seeking straight to the first one instead of
+    walking from the beginning of the series.
+    """
+    delta = step(series)
+    index = 0
+    if lower > series.start:
+        index = -((series.start - lower) // delta)  # ceil((lower - start) / delta)
+
+    while series.count is None or index < series.count:
+        start = series.start + index * delta
+        if start >= upper or (series.until and start.date() > series.until):
+            return
+        yield start
+        index += 1
+
+
+def expand(series, window_start, window_end):
+    """
+    Lazily yield the occurrences of `series` intersecting [window_start, window_end), earliest
+    first, with its exceptions applied: cancelled occurrences are skipped and moved ones appear
+    at their new date. Only the window is expanded, however long the series runs.
+    """
+    duration = timedelta(minutes=series.service.time)
+    exceptions = {}
+    if series.pk:
+        # Exceptions of starts the rule no longer has (its start, frequency or end changed) are ignored
+        exceptions = {
+            exception.original_date: exception for exception in series.exceptions.all()
+            if is_occurrence(series, exception.original_date)
+        }
+
+    regular = (
+        start for start in _regular_starts(series, window_start - duration, window_end)
+        if start not in exceptions
+    )
+    moved = sorted(
+        exception.new_date for exception in exceptions.values()
+        if not exception.cancelled and exception.new_date
+        and exception.new_date < window_end and exception.new_date + duration > window_start
+    )
+    for start in heapq.merge(regular, moved):
+        end = start + duration
+        if end > window_start or start >= window_start:
+            yield Occurrence(start, end, series)
+
+
+def last_end(series):
+    """
+    End of the rule's last regular occurrence, or None when the series repeats forever.
+    """
+    delta = step(series)
+    duration = timedelta(minutes=series.service.time)
+    ends = []
+    if series.count is not None:
+        ends.append(series.start + (series.count - 1) * delta + duration)
+    if series.until:
+        # Last start falling on or before `until`
+        index = (datetime.combine(series.until + timedelta(days=1), time.min) - series.start
+                 - timedelta(microseconds=1)) // delta
+        ends.append(series.start + index * delta + duration)
+    return min(ends, default=None)
+
+
+def is_occurrence(series, start):
+    """
+    Whether `start` is a regular (unmoved) start of the rule.
+    """
+    return next(_regular_starts(series, start, start + timedelta(microseconds=1)), None) == start
+
+
+def active_series(employee_ids, window_start, window_end):
+    """
+    Series of the employees which may have occurrences in the window.
+    """
+    return (
+        AppointmentSeries.objects
+        .filter(employee_id__in=employee_ids, start__lt=window_end)
+        .filter(Q(until__isnull=True) | Q(until__gte=window_start.date()))
+        .exclude(status='cancelled')
+        .select_related('service')
+        .prefetch_related('exceptions')
+    )
+
+
+def series_busy(employee_ids, window_start, window_end, exclude_series=None):
+    """
+    Map employee id to the sorted occurrences of its active series within the window.
+    Costs two queries whatever the number of employees and series.
+    """
+    series_list = active_series(employee_ids, window_start, window_end)
+    if exclude_series is not None:
+        series_list = series_list.exclude(pk=exclude_series)
+
+    busy = defaultdict(list)
+    for series in series_list:
+        busy[series.employee_id].extend(expand(series, window_start, window_end))
+    for occurrences in busy.values():
+        occurrences.sort(key=lambda occurrence: occurrence.date)
+    return busy
+
+
+def first_series_conflict(employee_id, start, end, exclude_series=None):
+    """
+    Return the first series occurrence of the employee overlapping [start, end), or None.
+    """
+    occurrences = series_busy([employee_id], start, end, exclude_series).get(employee_id, [])
+    return next((occurrence for occurrence in occurrences if occurrence.date < end and occurrence.end_date > start), None)
+
+
+def series_conflicts(series):
+    """
+    Return (occurrence, conflicting booking) pairs between the occurrences of `series` and the
+    employee's appointments and other series, over the validation horizon.
+    """
+    from .availability import overlapping_pairs  # availability builds on this module
+
+    occurrences = list(expand(series, series.start, series.start + VALIDATION_HORIZON))
+    if not occurrences:
+        return []
+    window_start, window_end = occurrences[0].date, max(occurrence.end_date for occurrence in occurrences)
+
+    appointments = (
+        Appointment.objects.filter(employee_id=series.employee_id)
+        .blocking()
+        .overlapping(window_start, window_end)
+        .only('date', 'end_date')
+    )
+    others = series_busy([series.employee_id], window_start, window_end, series.pk).get(series.employee_id, [])
+
+    intervals = [(occurrence.date, occurrence.end_date, (True, occurrence)) for occurrence in occurrences]
+    intervals += [(booking.date, booking.end_date, (False, booking)) for booking in [*appointments, *others]]
+
+    conflicts = []
+    for (new_a, a), (new_b, b) in overlapping_pairs(intervals):
+        if new_a != new_b:
+            conflicts.append((a, b) if new_a else (b, a))
+    conflicts.sort(key=lambda pair: pair[0].date)
+    return conflicts
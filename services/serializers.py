@@ -1,31 +1,155 @@
 from datetime import timedelta
 
-from django.db.models import Q
 from rest_framework import serializers
-from .models import Company, ServiceCategory, Service, Employee, Client, Appointment, WorkSchedule
+from rest_framework.permissions import SAFE_METHODS
+from .availability import DEFAULT_SLOT_STEP, MAX_RANGE_DAYS
+from .bulk import BULK_MAX_ITEMS
+from .export import EXPORT_FORMATS
+from .models import Company, ServiceCategory, Service, Employee, Client, Appointment, WorkSchedule, \
+    EmployeeDayOccupancy, AppointmentSeries, AppointmentSeriesException, APPOINTMENT_STATUS
+from .recurrence import first_series_conflict, is_occurrence, series_busy, series_conflicts
 from rest_framework.serializers import ValidationError
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Narrows the rendered fields to ?fields=a,b,c on read requests. Only the top-level serializer
+    is narrowed; viewsets pass the same names to setup_eager_loading so the joins and prefetches
+    of the skipped fields are dropped as well.
+    """
+    fields_query_param = 'fields'
+
+    @classmethod
+    def requested_fields(cls, request):
+        """
+        Return the requested field names, or None when every field is wanted.
+        """
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        value = request.query_params.get(cls.fields_query_param)
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        requested = self.requested_fields(self.context.get('request')) if parent is None else None
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the joins and prefetches its fields need, so a viewset can load
+    a whole list in a fixed number of queries instead of one or more per row.
+    """
+    # Field name -> relations to pass to select_related / prefetch_related when it is rendered
+    select_related_fields = {}
+    prefetch_related_fields = {}
+
+    @classmethod
+    def eager_loading_lookups(cls, fields=None, prefix=''):
+        """
+        Return the (select_related, prefetch_related) lookups of the declared plan, limited to
+        `fields` when given and prefixed with `prefix` when the serializer is nested.
+        """
+        select_related, prefetch_related = [], []
+        for plan, relations in ((cls.select_related_fields, select_related),
+                                (cls.prefetch_related_fields, prefetch_related)):
+            for field, lookups in plan.items():
+                if fields is None or field in fields:
+                    relations.extend(prefix + lookup for lookup in lookups if prefix + lookup not in relations)
+        return select_related, prefetch_related
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """
+        Apply the declared plan to the queryset, limited to `fields` when given.
+        """
+        return cls.apply_eager_loading(queryset, *cls.eager_loading_lookups(fields))
+
+    @staticmethod
+    def apply_eager_loading(queryset, select_related, prefetch_related):
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+class ExpandableFieldsMixin(EagerLoadingMixin):
+    """
+    Renders the relations in `expandable_fields` with their declared compact serializer unless
+    the request asks for the full one with ?expand=field[,field...] or ?expand=all.
+    """
+    # Field name -> serializer of its full representation
+    expandable_fields = {}
+    expand_query_param = 'expand'
+
+    @classmethod
+    def requested_expansions(cls, request):
+        if request is None:
+            return set()
+        names = {name.strip() for name in request.query_params.get(cls.expand_query_param, '').split(',')}
+        if 'all' in names:
+            return set(cls.expandable_fields)
+        return names & set(cls.expandable_fields)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in self.requested_expansions(self.context.get('request')):
+            if name in fields:
+                fields[name] = self.expandable_fields[name](read_only=True)
+        return fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=()):
+        """
+        Like EagerLoadingMixin.setup_eager_loading, adding the nested plans of the expanded fields.
+        """
+        select_related, prefetch_related = cls.eager_loading_lookups(fields)
+        for name in expand:
+            if fields is None or name in fields:
+                nested_select, nested_prefetch = cls.expandable_fields[name].eager_loading_lookups(prefix=f'{name}__')
+                select_related += [lookup for lookup in [name, *nested_select] if lookup not in select_related]
+                prefetch_related += [lookup for lookup in nested_prefetch if lookup not in prefetch_related]
+        return cls.apply_eager_loading(queryset, select_related, prefetch_related)
+
+
+class SummarySerializer(serializers.Serializer):
+    """
+    Compact read-only representation of a related object.
+    """
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+
+
+class CompanySerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
+    select_related_fields = {'user': ['user']}
+
     class Meta:
         model = Company
         fields = ['id', 'user', 'name', 'slug']
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField()
     service_category = serializers.PrimaryKeyRelatedField(
         queryset=ServiceCategory.objects.all()
     )
 
+    select_related_fields = {'user': ['user']}
+
     class Meta:
         model = Service
         fields = ['id', 'name', 'user', 'service_category']
 
 
-class ServiceCategorySerializer(serializers.ModelSerializer):
+class ServiceCategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField()
     services = serializers.SerializerMethodField()
     employees = serializers.SerializerMethodField()
@@ -40,10 +164,11 @@ class ServiceCategorySerializer(serializers.ModelSerializer):
         """
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
-            return ServiceSerializer(
-                obj.services.filter(user=request.user),  # Filtrare pe utilizatorul autentificat
-                many=True
-            ).data
+            # Folosim lista preîncărcată de ServiceCategoryViewSet dacă există
+            services = getattr(obj, 'user_services', None)
+            if services is None:
+                services = obj.services.filter(user=request.user)  # Filtrare pe utilizatorul autentificat
+            return ServiceSerializer(services, many=True).data
         return []
 
     def get_employees(self, obj):
@@ -53,13 +178,15 @@ class ServiceCategorySerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             # Filtrare pe angajați în funcție de utilizatorul autentificat
-            employees = obj.employees.filter(user=request.user)
+            employees = getattr(obj, 'user_employees', None)
+            if employees is None:
+                employees = obj.employees.filter(user=request.user)
             # Returnăm doar numele și ID-ul
             return [{'id': employee.id, 'name': employee.name} for employee in employees]
         return []
 
 
-class WorkScheduleSerializer(serializers.ModelSerializer):
+class WorkScheduleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WorkSchedule
         fields = ['id', 'employee', 'day_of_week', 'start_time', 'end_time']
@@ -68,30 +195,37 @@ class WorkScheduleSerializer(serializers.ModelSerializer):
         """
         Verifică dacă noul program de lucru se suprapune cu unul existent.
         """
-        employee = data.get("employee")
-        day_of_week = data.get("day_of_week")
-        start_time = data.get("start_time")
-        end_time = data.get("end_time")
+        def current(field):
+            # La actualizări parțiale păstrăm valorile existente
+            return data[field] if field in data else getattr(self.instance, field, None)
+
+        employee = current("employee")
+        day_of_week = current("day_of_week")
+        start_time = current("start_time")
+        end_time = current("end_time")
 
         if start_time and end_time and start_time >= end_time:
             raise serializers.ValidationError("End time must be after start time.")
+        if not (start_time and end_time):
+            return data  # Un program fără ore nu se poate suprapune
 
-        # Căutăm programările existente ale acestui angajat în aceeași zi
+        # O singură interogare pe indexul (employee, day_of_week); rândurile cu ore NULL nu se potrivesc
         overlapping_schedules = WorkSchedule.objects.filter(
             employee=employee,
-            day_of_week=day_of_week
-        ).exclude(id=self.instance.id if self.instance else None)  # Excludem propriul obiect dacă e o actualizare
+            day_of_week=day_of_week,
+            start_time__lt=end_time,
+            end_time__gt=start_time,
+        )
+        if self.instance:
+            overlapping_schedules = overlapping_schedules.exclude(pk=self.instance.pk)  # Excludem propriul obiect
 
-        for schedule in overlapping_schedules:
-            if (schedule.start_time <= start_time < schedule.end_time) or \
-               (schedule.start_time < end_time <= schedule.end_time) or \
-               (start_time <= schedule.start_time and end_time >= schedule.end_time):
-                raise serializers.ValidationError("This employee's schedule overlaps with an existing entry.")
+        if overlapping_schedules.exists():
+            raise serializers.ValidationError("This employee's schedule overlaps with an existing entry.")
 
         return data
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField()
     service_categories = serializers.PrimaryKeyRelatedField(
         queryset=ServiceCategory.objects.all(),
@@ -100,6 +234,13 @@ class EmployeeSerializer(serializers.ModelSerializer):
     service_category_names = serializers.SerializerMethodField()
     work_schedules = WorkScheduleSerializer(many=True, read_only=True)  # Adăugăm programul de lucru
 
+    select_related_fields = {'user': ['user']}
+    prefetch_related_fields = {
+        'service_categories': ['service_categories'],
+        'service_category_names': ['service_categories'],
+        'work_schedules': ['work_schedules'],
+    }
+
     class Meta:
         model = Employee
         fields = ['id', 'user', 'name', 'service_categories', 'service_category_names', 'work_schedules']
@@ -109,35 +250,59 @@ class EmployeeSerializer(serializers.ModelSerializer):
         return [category.name for category in obj.service_categories.all()]
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField()
 
+    select_related_fields = {'user': ['user']}
+
     class Meta:
         model = Client
         fields = ['id', 'user', 'name', 'email']
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+def _booked_message(employee, conflict):
+    return (
+        f"{employee.name} is already booked between "
+        f"{conflict.date.strftime('%Y-%m-%d %H:%M:%S')} and "
+        f"{conflict.end_date.strftime('%Y-%m-%d %H:%M:%S')}. "
+        "Please choose another time."
+    )
+
+
+class AppointmentSerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField()
-    client = ClientSerializer(read_only=True)
+    client = SummarySerializer(read_only=True)
     client_id = serializers.PrimaryKeyRelatedField(
         queryset=Client.objects.all(),
         source='client',
         write_only=True
     )
-    service = ServiceSerializer(read_only=True)
+    service = SummarySerializer(read_only=True)
     service_id = serializers.PrimaryKeyRelatedField(
         queryset=Service.objects.all(),
         source='service',
         write_only=True
     )
-    employee = EmployeeSerializer(read_only=True)
+    employee = SummarySerializer(read_only=True)
     employee_id = serializers.PrimaryKeyRelatedField(
         queryset=Employee.objects.all(),
         source='employee',
         write_only=True
     )
 
+    # Listele trimit doar {id, name}; ?expand=client,service,employee (sau all) dă obiectele complete
+    expandable_fields = {
+        'client': ClientSerializer,
+        'service': ServiceSerializer,
+        'employee': EmployeeSerializer,
+    }
+    select_related_fields = {
+        'user': ['user'],
+        'client': ['client'],
+        'service': ['service'],
+        'employee': ['employee'],
+    }
+
     class Meta:
         model = Appointment
         fields = [
@@ -153,7 +318,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
         service = data.get('service')
         employee = data.get('employee')
 
-        if date and service and employee:
+        if date and service and employee and data.get('status') != 'cancelled':
             service_duration = service.time  # Duration in minutes
             start_time = date
             end_time = start_time + timedelta(minutes=service_duration)
@@ -161,27 +326,242 @@ class AppointmentSerializer(serializers.ModelSerializer):
             # Check for overlapping appointments
             overlapping_appointments = Appointment.objects.filter(
                 employee=employee
-            ).filter(
-                Q(date__lt=end_time, end_date__gt=start_time)
-            )
+            ).blocking().overlapping(start_time, end_time)
 
             # Exclude current instance in case of update
             if self.instance:
                 overlapping_appointments = overlapping_appointments.exclude(pk=self.instance.pk)
 
-            if overlapping_appointments.exists():
-                # Get details of the conflicting appointment
-                conflicting_appointment = overlapping_appointments.first()
-                conflicting_start = conflicting_appointment.date
-                conflicting_end = conflicting_appointment.end_date
+            # A single probe on the (employee, date, end_date) index fetches the conflict, if any,
+            # then the occurrences of the employee's recurring series in the same window
+            conflicting_appointment = overlapping_appointments.only('date', 'end_date').first() \
+                or first_series_conflict(employee.id, start_time, end_time)
+            if conflicting_appointment:
+                raise ValidationError({'date': _booked_message(employee, conflicting_appointment)})
+
+        return data
+
+
+class AppointmentSeriesExceptionSerializer(serializers.ModelSerializer):
+    """
+    Moves (new_date) or cancels one occurrence of the series passed in the context.
+    """
+    class Meta:
+        model = AppointmentSeriesException
+        fields = ['id', 'original_date', 'new_date', 'cancelled']
+
+    def validate(self, data):
+        series = self.context['series']
+        original_date = data['original_date']
+        new_date = data.get('new_date')
+
+        if not is_occurrence(series, original_date):
+            raise ValidationError({'original_date': "The series has no occurrence at this date."})
+        if data.get('cancelled'):
+            data['new_date'] = None
+        elif new_date is None:
+            raise ValidationError("Set either new_date or cancelled.")
+        elif series.status != 'cancelled':
+            end_date = new_date + timedelta(minutes=series.service.time)
+            conflict = Appointment.objects.filter(employee_id=series.employee_id) \
+                .blocking().overlapping(new_date, end_date).only('date', 'end_date').first()
+            if conflict is None:
+                # The occurrence being moved no longer blocks its old or current slot
+                own = {original_date} | {
+                    exception.new_date for exception in series.exceptions.all() if exception.original_date == original_date
+                }
+                conflict = next((
+                    occurrence
+                    for occurrence in series_busy([series.employee_id], new_date, end_date).get(series.employee_id, [])
+                    if not (occurrence.series.pk == series.pk and occurrence.date in own)
+                ), None)
+            if conflict:
+                raise ValidationError({'new_date': _booked_message(series.employee, conflict)})
+        return data
+
+
+class AppointmentSeriesSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.StringRelatedField()
+    client_id = serializers.PrimaryKeyRelatedField(queryset=Client.objects.all(), source='client')
+    service_id = serializers.PrimaryKeyRelatedField(queryset=Service.objects.all(), source='service')
+    employee_id = serializers.PrimaryKeyRelatedField(queryset=Employee.objects.all(), source='employee')
+    interval = serializers.IntegerField(min_value=1, default=1)
+    count = serializers.IntegerField(min_value=1, allow_null=True, required=False)
+    exceptions = AppointmentSeriesExceptionSerializer(many=True, read_only=True)
+
+    select_related_fields = {'user': ['user']}
+    prefetch_related_fields = {'exceptions': ['exceptions']}
+
+    class Meta:
+        model = AppointmentSeries
+        fields = [
+            'id', 'user', 'client_id', 'service_id', 'employee_id', 'start', 'frequency', 'interval',
+            'until', 'count', 'status', 'exceptions', 'created_at', 'updated_at',
+        ]
 
+    def validate(self, data):
+        """
+        Check the occurrences against the employee's appointments and other series over the
+        validation horizon (see services.recurrence).
+        """
+        fields = ['client', 'service', 'employee', 'start', 'frequency', 'interval', 'until', 'count', 'status']
+        current = {field: getattr(self.instance, field) for field in fields} if self.instance else {}
+        series = AppointmentSeries(pk=self.instance.pk if self.instance else None, **{**current, **data})
+
+        if series.until and series.until < series.start.date():
+            raise ValidationError({'until': "until must not be before the start date."})
+        if series.status != 'cancelled':
+            conflicts = series_conflicts(series)
+            if conflicts:
+                occurrence, conflict = conflicts[0]
                 raise ValidationError({
-                    'date': (
-                        f"{employee.name} is already booked between "
-                        f"{conflicting_start.strftime('%Y-%m-%d %H:%M:%S')} and "
-                        f"{conflicting_end.strftime('%Y-%m-%d %H:%M:%S')}. "
-                        "Please choose another time."
-                    )
+                    'start': f"The occurrence of {occurrence.date.strftime('%Y-%m-%d %H:%M:%S')} overlaps: "
+                             + _booked_message(series.employee, conflict)
                 })
+        return data
+
+
+class SeriesOccurrencesQuerySerializer(serializers.Serializer):
+    employee_id = serializers.IntegerField(required=False)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, data):
+        date_from = data['date_from']
+        date_to = data.setdefault('date_to', date_from + timedelta(days=6))
+        if date_to < date_from:
+            raise ValidationError({'date_to': "date_to must not be before date_from."})
+        if (date_to - date_from).days >= MAX_RANGE_DAYS:
+            raise ValidationError({'date_to': f"The range can span at most {MAX_RANGE_DAYS} days."})
+        return data
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    employee_id = serializers.IntegerField(required=False)
+    category_id = serializers.IntegerField(required=False)
+    service_id = serializers.IntegerField()
+    date_from = serializers.DateField()
+    date_to = serializers.DateField(required=False)
+    step = serializers.IntegerField(default=DEFAULT_SLOT_STEP, min_value=5, max_value=240)
+
+    def validate(self, data):
+        """
+        Default to a one-week window and refuse ranges that are reversed or too long.
+        """
+        if 'employee_id' in data and 'category_id' in data:
+            raise ValidationError("Use either employee_id or category_id, not both.")
+
+        date_from = data['date_from']
+        date_to = data.setdefault('date_to', date_from + timedelta(days=6))
+
+        if date_to < date_from:
+            raise ValidationError({'date_to': "date_to must not be before date_from."})
+        if (date_to - date_from).days >= MAX_RANGE_DAYS:
+            raise ValidationError({'date_to': f"The range can span at most {MAX_RANGE_DAYS} days."})
 
         return data
+
+
+class AppointmentFilterSerializer(serializers.Serializer):
+    """
+    Query parameters accepted by the appointment list.
+
+    date_from is inclusive and date_to exclusive; a date_to given as a plain date covers that whole day.
+    status takes a comma separated list.
+    """
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+    status = serializers.CharField(required=False)
+    employee_id = serializers.IntegerField(required=False)
+    client_id = serializers.IntegerField(required=False)
+    service_id = serializers.IntegerField(required=False)
+
+    def validate_date_to(self, value):
+        if len(self.initial_data.get('date_to', '')) == len('YYYY-MM-DD'):
+            value += timedelta(days=1)
+        return value
+
+    def validate_status(self, value):
+        statuses = [status.strip() for status in value.split(',') if status.strip()]
+        allowed = {key for key, _ in APPOINTMENT_STATUS}
+        unknown = [status for status in statuses if status not in allowed]
+        if unknown:
+            raise ValidationError(f"Unknown status: {', '.join(unknown)}.")
+        return statuses
+
+    def validate(self, data):
+        if 'date_from' in data and 'date_to' in data and data['date_to'] <= data['date_from']:
+            raise ValidationError({'date_to': "date_to must be after date_from."})
+        return data
+
+
+class AppointmentBulkItemSerializer(serializers.Serializer):
+    """
+    One appointment of a bulk request; `id` is required when updating.
+    """
+    id = serializers.IntegerField(required=False)
+    client_id = serializers.IntegerField()
+    service_id = serializers.IntegerField()
+    employee_id = serializers.IntegerField()
+    date = serializers.DateTimeField()
+    status = serializers.ChoiceField(choices=APPOINTMENT_STATUS, default='scheduled')
+
+
+class WeeklyScheduleDaySerializer(serializers.Serializer):
+    day_of_week = serializers.ChoiceField(choices=WorkSchedule.DAY_CHOICES)
+    start_time = serializers.TimeField(allow_null=True, required=False)
+    end_time = serializers.TimeField(allow_null=True, required=False)
+
+    def validate(self, data):
+        start_time = data.get("start_time")
+        end_time = data.get("end_time")
+        if start_time and end_time and start_time >= end_time:
+            raise serializers.ValidationError("End time must be after start time.")
+        return data
+
+
+class WorkScheduleBulkItemSerializer(WeeklyScheduleDaySerializer):
+    """
+    One work schedule row of a bulk request; `id` is required when updating.
+    """
+    id = serializers.IntegerField(required=False)
+    employee = serializers.IntegerField()
+
+
+class WeeklyScheduleSerializer(serializers.Serializer):
+    """
+    The complete weekly schedule of an employee; a day may have several rows or none.
+    """
+    employee = serializers.IntegerField()
+    days = WeeklyScheduleDaySerializer(many=True, max_length=BULK_MAX_ITEMS)
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_ITEMS)
+
+
+class AppointmentChangesQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False)
+    # Set by the next link, so every page of a sync returns the watermark of the first one
+    watermark = serializers.DateTimeField(required=False)
+
+
+class EmployeeDayOccupancySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = EmployeeDayOccupancy
+        fields = [
+            'id', 'employee', 'date', 'scheduled_minutes', 'booked_minutes', 'appointment_count',
+            'utilization', 'is_fully_booked',
+        ]
+
+
+class OccupancyFilterSerializer(serializers.Serializer):
+    employee_id = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    fully_booked = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    # Not `format`, which DRF reserves for picking a renderer
+    type = serializers.ChoiceField(choices=EXPORT_FORMATS, default='csv')
@@ -0,0 +1,123 @@
+from datetime import timedelta
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import REFERENCE_DATA, bump_version
+from .conditional import touch
+from .models import Company, Service, ServiceCategory, Employee, WorkSchedule, LeaveDay, Client, Appointment, \
+    AppointmentDeletion, AppointmentSeries, AppointmentSeriesException
+from .occupancy import affected_days, appointment_days, refresh_after_commit, refresh_series, refresh_weekdays
+
+
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=ServiceCategory)
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=WorkSchedule)
+def invalidate_reference_data(sender, instance, **kwargs):
+    """
+    Any change to services, categories, employees or schedules invalidates the tenant's cached lists.
+    """
+    bump_version(instance.user_id, REFERENCE_DATA)
+
+
+@receiver(m2m_changed, sender=Employee.service_categories.through)
+def invalidate_employee_categories(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(instance.user_id, REFERENCE_DATA)
+        touch(instance.user_id, Employee, ServiceCategory)
+
+
+@receiver([post_save, post_delete], sender=Company)
+@receiver([post_save, post_delete], sender=Service)
+@receiver([post_save, post_delete], sender=ServiceCategory)
+@receiver([post_save, post_delete], sender=Employee)
+@receiver([post_save, post_delete], sender=WorkSchedule)
+@receiver([post_save, post_delete], sender=Client)
+@receiver([post_save, post_delete], sender=Appointment)
+@receiver([post_save, post_delete], sender=AppointmentSeries)
+def record_tenant_change(sender, instance, origin=None, **kwargs):
+    """
+    Bump the tenant's change counter of the model, which feeds the ETags of the API.
+    """
+    if not deleting_account(origin):
+        touch(instance.user_id, sender)
+
+
+def deleting_account(origin):
+    user_model = get_user_model()
+    return isinstance(origin, user_model) or getattr(origin, 'model', None) is user_model
+
+
+@receiver(post_delete, sender=Appointment)
+def record_appointment_deletion(sender, instance, origin=None, **kwargs):
+    """
+    Leave a tombstone for the changes feed (AppointmentViewSet.changes).
+    """
+    if deleting_account(origin):
+        return  # the whole account is going away, tombstones included
+    AppointmentDeletion.objects.create(user_id=instance.user_id, appointment_id=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def refresh_appointment_occupancy(sender, instance, **kwargs):
+    """
+    Recompute the occupancy of the days the appointment occupies, and occupied before the change.
+    """
+    refresh_after_commit(affected_days([instance]))
+    instance._loaded_values = {
+        'employee_id': instance.employee_id, 'date': instance.date, 'end_date': instance.end_date,
+    }
+
+
+@receiver(post_save, sender=WorkSchedule)
+def refresh_saved_schedule_occupancy(sender, instance, created, **kwargs):
+    # An update may have moved the row to another day, so recompute every weekday then
+    weekdays = {instance.day_of_week} if created else set(range(7))
+    transaction.on_commit(partial(refresh_weekdays, instance.employee_id, weekdays))
+
+
+@receiver(post_delete, sender=WorkSchedule)
+def refresh_deleted_schedule_occupancy(sender, instance, **kwargs):
+    transaction.on_commit(partial(refresh_weekdays, instance.employee_id, {instance.day_of_week}))
+
+
+@receiver([post_save, post_delete], sender=LeaveDay)
+def refresh_leave_day_occupancy(sender, instance, **kwargs):
+    refresh_after_commit({instance.employee_id: {instance.date}})
+
+
+@receiver([post_save, post_delete], sender=AppointmentSeriesException)
+def record_series_exception_change(sender, instance, origin=None, **kwargs):
+    if not deleting_account(origin):
+        touch(instance.series.user_id, AppointmentSeries)
+
+
+@receiver([post_save, post_delete], sender=AppointmentSeries)
+def refresh_series_occupancy(sender, instance, **kwargs):
+    employee_ids = {instance.employee_id}
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded and loaded.get('employee_id'):
+        employee_ids.add(loaded['employee_id'])
+    transaction.on_commit(partial(refresh_series, instance, employee_ids))
+    instance._loaded_values = {'employee_id': instance.employee_id}
+
+
+@receiver([post_save, post_delete], sender=AppointmentSeriesException)
+def refresh_series_exception_occupancy(sender, instance, **kwargs):
+    """
+    Recompute the day the occurrence was moved or cancelled from, the day it moved to, and the
+    day it had been moved to before this change.
+    """
+    series = instance.series
+    duration = timedelta(minutes=series.service.time)
+    days = set(appointment_days(instance.original_date, instance.original_date + duration))
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    for new_date in {instance.new_date, loaded.get('new_date')}:
+        if new_date:
+            days.update(appointment_days(new_date, new_date + duration))
+    refresh_after_commit({series.employee_id: days})
+    instance._loaded_values = {'new_date': instance.new_date}
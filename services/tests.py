@@ -1,3 +1,609 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from io import StringIO
 
-# Create your tests here.
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from unify.middleware import CompressionMiddleware, brotli
+from users.models import CustomUser
+from .cache import stats
+from .models import (
+    ServiceCategory, Service, Employee, WorkSchedule, LeaveDay, Client, Appointment, AppointmentSeries,
+    EmployeeDayOccupancy, TenantChange,
+)
+from .recurrence import expand, last_end
+
+
+class ServiceCategoryListTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+
+    def create_category(self, index, user=None):
+        user = user or self.user
+        category = ServiceCategory.objects.create(user=user, name=f'Category {index}')
+        Service.objects.create(user=user, service_category=category, name=f'Service {index}', time=30)
+        employee = Employee.objects.create(user=user, name=f'Employee {index}')
+        employee.service_categories.add(category)
+        return category
+
+    def list_categories(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/service_category/')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_query_count_does_not_grow_with_categories(self):
+        self.create_category(1)
+        _, baseline = self.list_categories()
+
+        for index in range(2, 7):
+            self.create_category(index)
+        data, queries = self.list_categories()
+
+        self.assertEqual(len(data), 6)
+        self.assertEqual(queries, baseline)
+
+    def test_lists_only_the_users_services_and_employees(self):
+        category = self.create_category(1)
+        other = CustomUser.objects.create_user(email='other@example.com', password='parola-test')
+        Service.objects.create(user=other, service_category=category, name='Foreign service', time=30)
+        Employee.objects.create(user=other, name='Foreign employee').service_categories.add(category)
+
+        data, _ = self.list_categories()
+
+        self.assertEqual([service['name'] for service in data[0]['services']], ['Service 1'])
+        self.assertEqual([employee['name'] for employee in data[0]['employees']], ['Employee 1'])
+
+
+# The local-memory cache stands in for Redis, as the tests run in a single process
+shared_cache = mock.patch('services.cache.is_shared_cache', new=lambda alias='default': True)
+
+
+class CachedListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+        Service.objects.create(user=self.user, name='Tuns', time=30)
+
+    def list_services(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/services/')
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries if 'services_service' in query['sql']]
+
+    @shared_cache
+    def test_list_is_cached_until_a_change_commits(self):
+        response, queries = self.list_services()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(queries)
+
+        response, queries = self.list_services()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(queries, [])
+        self.assertEqual(stats(['services']), {'services': {'hits': 1, 'misses': 1}})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Service.objects.create(user=self.user, name='Vopsit', time=60)
+            # Not invalidated before the commit, so no one caches the old rows under the new version
+            self.assertEqual(self.list_services()[0]['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+
+        response, _ = self.list_services()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_list_is_not_cached_without_a_shared_cache(self):
+        self.list_services()
+        response, queries = self.list_services()
+        self.assertNotIn('X-Cache', response)
+        self.assertTrue(queries)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+
+    def test_change_invalidates_etag(self):
+        etag = self.client.get('/api/clients/')['ETag']
+        self.assertEqual(self.client.get('/api/clients/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+        response = self.client.get('/api/clients/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_if_modified_since(self):
+        Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+        # A change from this second could still be followed by another one with the same Last-Modified
+        self.assertNotIn('Last-Modified', self.client.get('/api/clients/'))
+
+        TenantChange.objects.update(changed_at=timezone.now() - timedelta(minutes=1))
+        last_modified = self.client.get('/api/clients/')['Last-Modified']
+        self.assertEqual(self.client.get('/api/clients/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        Client.objects.create(user=self.user, name='Ion Pop', email='ion@example.com')
+        response = self.client.get('/api/clients/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_queryset_update_invalidates_etag(self):
+        service = Service.objects.create(user=self.user, name='Tuns', time=30)
+        employee = Employee.objects.create(user=self.user, name='Maria')
+        client = Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+        appointment = Appointment.objects.create(
+            user=self.user, client=client, service=service, employee=employee, date=datetime(2030, 1, 7, 10),
+        )
+        etag = self.client.get('/api/appointments/')['ETag']
+
+        # No post_save is sent for this one
+        Appointment.objects.filter(pk=appointment.pk).update(status='cancelled')
+        response = self.client.get('/api/appointments/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['status'], 'cancelled')
+
+
+class AppointmentChangesTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+
+    def test_full_sync_is_paginated_with_a_lagged_watermark(self):
+        service = Service.objects.create(user=self.user, name='Tuns', time=30)
+        employee = Employee.objects.create(user=self.user, name='Maria')
+        client = Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+        for hour in range(9, 14):
+            Appointment.objects.create(
+                user=self.user, client=client, service=service, employee=employee, date=datetime(2030, 1, 7, hour),
+            )
+
+        started = timezone.now()
+        response = self.client.get('/api/appointments/changes/?page_size=2').json()
+        ids, watermarks = [], set()
+        while True:
+            ids += [item['id'] for item in response['changed']]
+            watermarks.add(response['watermark'])
+            if response['next'] is None:
+                break
+            response = self.client.get(response['next']).json()
+
+        self.assertCountEqual(ids, Appointment.objects.values_list('id', flat=True))
+        self.assertEqual(len(watermarks), 1)
+        self.assertLess(datetime.fromisoformat(watermarks.pop()), started)
+
+
+class AppointmentSeriesTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+        self.service = Service.objects.create(user=self.user, name='Tuns', time=60)
+        self.employee = Employee.objects.create(user=self.user, name='Maria')
+        self.customer = Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+
+    def create_series(self, **fields):
+        return AppointmentSeries.objects.create(
+            user=self.user, client=self.customer, service=self.service, employee=self.employee,
+            **{'start': datetime(2030, 1, 7, 10), 'frequency': 'weekly', **fields},
+        )
+
+    def occurrence_dates(self, date_from='2030-01-01', date_to='2030-01-31'):
+        response = self.client.get('/api/appointment-series/occurrences/', {'date_from': date_from, 'date_to': date_to})
+        self.assertEqual(response.status_code, 200)
+        return [datetime.fromisoformat(occurrence['date']) for occurrence in response.json()]
+
+    def test_expansion_is_limited_to_the_window_and_the_rule(self):
+        series = self.create_series(count=4)
+        window = list(expand(series, datetime(2030, 1, 20), datetime(2030, 3, 1)))
+        self.assertEqual([occurrence.date for occurrence in window], [datetime(2030, 1, 21, 10), datetime(2030, 1, 28, 10)])
+        self.assertEqual(last_end(series), datetime(2030, 1, 28, 11))
+
+        series = self.create_series(start=datetime(2030, 1, 7, 14), frequency='daily', interval=2, until=date(2030, 1, 12))
+        self.assertEqual(
+            [occurrence.date.day for occurrence in expand(series, datetime(2030, 1, 1), datetime(2030, 2, 1))], [7, 9, 11],
+        )
+        self.assertEqual(last_end(series), datetime(2030, 1, 11, 15))
+
+    def test_exceptions_cancel_and_move_occurrences(self):
+        series = self.create_series(count=3)
+        series.exceptions.create(original_date=datetime(2030, 1, 7, 10), cancelled=True)
+        series.exceptions.create(original_date=datetime(2030, 1, 14, 10), new_date=datetime(2030, 1, 15, 12))
+        self.assertEqual(self.occurrence_dates(), [datetime(2030, 1, 15, 12), datetime(2030, 1, 21, 10)])
+
+    def test_moving_an_exception_again_refreshes_the_previous_day(self):
+        series = self.create_series(count=3)
+        url = f'/api/appointment-series/{series.pk}/exceptions/'
+        for new_date in ('2030-01-15T10:00:00', '2030-01-16T10:00:00'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {'original_date': '2030-01-14T10:00:00', 'new_date': new_date}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        booked = dict(EmployeeDayOccupancy.objects.filter(employee=self.employee).values_list('date', 'booked_minutes'))
+        self.assertEqual(booked.get(date(2030, 1, 15), 0), 0)
+        self.assertEqual(booked[date(2030, 1, 16)], 60)
+        self.assertEqual(booked.get(date(2030, 1, 14), 0), 0)
+
+    def test_exceptions_of_starts_the_rule_lost_are_ignored(self):
+        series = self.create_series()
+        response = self.client.post(f'/api/appointment-series/{series.pk}/exceptions/', {
+            'original_date': '2030-01-14T10:00:00', 'new_date': '2030-01-14T12:00:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(datetime(2030, 1, 14, 12), self.occurrence_dates())
+
+        response = self.client.patch(f'/api/appointment-series/{series.pk}/', {'start': '2030-01-08T10:00:00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        dates = self.occurrence_dates()
+        self.assertEqual(dates, [datetime(2030, 1, day, 10) for day in (8, 15, 22, 29)])
+
+        # The phantom booking no longer blocks the slot either
+        response = self.client.post('/api/appointments/', {
+            'client_id': self.customer.pk, 'service_id': self.service.pk, 'employee_id': self.employee.pk,
+            'date': '2030-01-14T12:00:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_occurrences_conflict_with_appointments(self):
+        self.create_series()
+        response = self.client.post('/api/appointments/', {
+            'client_id': self.customer.pk, 'service_id': self.service.pk, 'employee_id': self.employee.pk,
+            'date': '2030-02-04T10:30:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.json())
+
+        Appointment.objects.create(
+            user=self.user, client=self.customer, service=self.service, employee=self.employee,
+            date=datetime(2030, 1, 9, 9),
+        )
+        response = self.client.post('/api/appointment-series/', {
+            'client_id': self.customer.pk, 'service_id': self.service.pk, 'employee_id': self.employee.pk,
+            'start': '2030-01-02T09:30:00', 'frequency': 'weekly',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('2030-01-09 09:30:00', response.json()['start'][0])
+
+
+class ImportRecordsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.other = CustomUser.objects.create_user(email='other@example.com', password='parola-test')
+        self.service = Service.objects.create(user=self.user, name='Tuns', time=60)
+        self.employee = Employee.objects.create(user=self.user, name='Maria')
+        self.customer = Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+        Client.objects.create(user=self.other, name='Dan Ionescu', email='dan@example.com')
+
+    def import_records(self, kind, content, suffix):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_records', kind, handle.name, user=self.user.email, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_clients_of_other_accounts_are_reported(self):
+        version = TenantChange.objects.get(user=self.user, model='client').version
+        stdout, stderr = self.import_records('clients', (
+            "name,email\n"
+            "ana pop,ana@example.com\n"
+            "dan ionescu,dan@example.com\n"
+            "ioana rus,ioana@example.com\n"
+            "Ioana Rus,ioana@example.com\n"
+            ",nobody@example.com\n"
+        ), '.csv')
+
+        self.assertIn("created 1, skipped 2 (1 owned by another account), already present 2", stdout)
+        self.assertIn("Record 2: a client named Dan Ionescu with email dan@example.com belongs to another account.", stderr)
+        self.assertEqual(
+            list(Client.objects.filter(user=self.user).values_list('name', flat=True)), ['Ana Pop', 'Ioana Rus'],
+        )
+        self.assertEqual(Client.objects.get(email='dan@example.com').user, self.other)
+        self.assertEqual(TenantChange.objects.get(user=self.user, model='client').version, version + 1)
+
+    def test_appointments_skip_invalid_and_conflicting_records(self):
+        Appointment.objects.create(
+            user=self.user, client=self.customer, service=self.service, employee=self.employee,
+            date=datetime(2030, 1, 10, 10),
+        )
+        record = {'client': 'Ana Pop', 'client_email': 'ana@example.com', 'service': 'Tuns', 'employee': 'Maria'}
+        dates = ['2030-01-10T10:30:00', '2030-01-11T10:00:00', '2030-02-30T10:00:00', '2030-03-01T10:00:00']
+        records = [{**record, 'date': value} for value in dates] + [{**record, 'employee': 'Ion', 'date': dates[1]}]
+        stdout, stderr = self.import_records('appointments', ''.join(json.dumps(row) + '\n' for row in records), '.ndjson')
+
+        self.assertIn("Read 5 record(s), created 2, skipped 3, already present 0", stdout)
+        self.assertIn("Record 1: Maria is already booked between 2030-01-10 10:00:00 and 2030-01-10 11:00:00.", stderr)
+        self.assertIn("Record 3: date is missing or invalid.", stderr)
+        self.assertIn("Record 5: unknown client, service or employee.", stderr)
+        self.assertEqual(
+            list(Appointment.objects.values_list('date', 'end_date')),
+            [(datetime(2030, 1, 10, 10), datetime(2030, 1, 10, 11)),
+             (datetime(2030, 1, 11, 10), datetime(2030, 1, 11, 11)),
+             (datetime(2030, 3, 1, 10), datetime(2030, 3, 1, 11))],
+        )
+        booked = dict(EmployeeDayOccupancy.objects.filter(employee=self.employee).values_list('date', 'booked_minutes'))
+        self.assertEqual(booked[date(2030, 3, 1)], 60)
+
+
+class CompressionTests(TestCase):
+    body = b'{"name": "Tuns", "time": 60}' * 100
+
+    def compressed(self, accept_encoding):
+        request = RequestFactory().get('/api/services/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        middleware = CompressionMiddleware(lambda request: HttpResponse(self.body, content_type='application/json'))
+        return middleware(request)
+
+    def assert_padded(self, encoding, decompress):
+        lengths = set()
+        for _ in range(20):
+            response = self.compressed(encoding)
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(decompress(response.content), self.body)
+            lengths.add(len(response.content))
+        # Random padding against BREACH: the length of a response does not give its content away
+        self.assertGreater(len(lengths), 1)
+
+    def test_gzip_output_is_padded(self):
+        self.assert_padded('gzip', gzip.decompress)
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_output_is_padded(self):
+        self.assert_padded('br', brotli.decompress)
+
+
+class AvailabilityTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+        self.category = ServiceCategory.objects.create(user=self.user, name='Coafură')
+        self.service = Service.objects.create(user=self.user, service_category=self.category, name='Tuns', time=60)
+        self.customer = Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+        self.maria = self.create_employee('Maria', time(9), time(12))
+        # Monday 2030-01-07: 10:00 is booked, the next Monday is a leave day
+        Appointment.objects.create(
+            user=self.user, client=self.customer, service=self.service, employee=self.maria,
+            date=datetime(2030, 1, 7, 10),
+        )
+        LeaveDay.objects.create(employee=self.maria, date=date(2030, 1, 14))
+
+    def create_employee(self, name, start, end):
+        employee = Employee.objects.create(user=self.user, name=name)
+        employee.service_categories.add(self.category)
+        WorkSchedule.objects.create(user=self.user, employee=employee, day_of_week=0, start_time=start, end_time=end)
+        return employee
+
+    def availability(self, queries, **params):
+        params = {'service_id': self.service.pk, 'date_from': '2030-01-07', 'date_to': '2030-01-14', 'step': 60, **params}
+        with self.assertNumQueries(queries):
+            response = self.client.get('/api/availability/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['slots']
+
+    def test_employee_slots_skip_bookings_and_leave_days(self):
+        slots = self.availability(6, employee_id=self.maria.pk)
+        self.assertEqual(slots, ['2030-01-07T09:00:00', '2030-01-07T11:00:00'])
+
+    def test_category_slots_merge_employees_in_constant_queries(self):
+        ion = self.create_employee('Ion', time(10), time(12))
+        slots = self.availability(7)
+        self.assertEqual(slots, [
+            {'start': '2030-01-07T09:00:00', 'employee_ids': [self.maria.pk]},
+            {'start': '2030-01-07T10:00:00', 'employee_ids': [ion.pk]},
+            {'start': '2030-01-07T11:00:00', 'employee_ids': sorted([self.maria.pk, ion.pk])},
+            {'start': '2030-01-14T10:00:00', 'employee_ids': [ion.pk]},
+            {'start': '2030-01-14T11:00:00', 'employee_ids': [ion.pk]},
+        ])
+
+        # More employees, same number of queries
+        others = [self.create_employee(name, time(9), time(10)).pk for name in ('Dana', 'Elena', 'Radu')]
+        slots = self.availability(7)
+        self.assertEqual(slots[0], {'start': '2030-01-07T09:00:00', 'employee_ids': sorted([self.maria.pk, *others])})
+        self.assertEqual(slots[3], {'start': '2030-01-14T09:00:00', 'employee_ids': sorted(others)})
+
+
+class BulkWriteTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+        self.service = Service.objects.create(user=self.user, name='Tuns', time=60)
+        self.employee = Employee.objects.create(user=self.user, name='Maria')
+        self.customer = Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+
+    def item(self, day, hour, **fields):
+        return {
+            'client_id': self.customer.pk, 'service_id': self.service.pk, 'employee_id': self.employee.pk,
+            'date': f'2030-01-{day:02d}T{hour:02d}:00:00', **fields,
+        }
+
+    def bulk(self, method, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)('/api/appointments/bulk/', data, format='json')
+        return response, len(queries)
+
+    def test_create_is_all_or_nothing(self):
+        response, _ = self.bulk('post', [self.item(7, 10), self.item(7, 10, status='confirmed'), self.item(7, 12)])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('non_field_errors', errors[1])
+        self.assertIn('date', errors[1])
+        self.assertEqual(errors[2], {})
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_create_runs_the_same_queries_for_any_batch_size(self):
+        # The first write also creates the tenant's change counter
+        self.bulk('post', [self.item(6, 9)])
+        response, small = self.bulk('post', [self.item(7, hour) for hour in (9, 10)])
+        self.assertEqual(response.status_code, 201)
+        response, large = self.bulk('post', [self.item(8, hour) for hour in range(9, 17)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 8)
+        self.assertEqual(small, large)
+        self.assertEqual(
+            Appointment.objects.get(date=datetime(2030, 1, 8, 16)).end_date, datetime(2030, 1, 8, 17),
+        )
+
+    def test_update_and_delete(self):
+        response, _ = self.bulk('post', [self.item(7, 9), self.item(7, 10), self.item(7, 11)])
+        first, second, third = (appointment['id'] for appointment in response.json())
+
+        # Moving one onto another is refused, as is a batch that double-books itself
+        response, _ = self.bulk('patch', [{'id': first, 'date': '2030-01-07T10:30:00'}])
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.bulk('patch', [
+            {'id': first, 'date': '2030-01-07T14:00:00'}, {'id': second, 'date': '2030-01-07T14:30:00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn('date', response.json()[1])
+
+        response, _ = self.bulk('patch', [
+            {'id': first, 'date': '2030-01-07T14:00:00'}, {'id': second, 'date': '2030-01-07T15:00:00'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Appointment.objects.order_by('pk').values_list('date', 'end_date')),
+            [(datetime(2030, 1, 7, 14), datetime(2030, 1, 7, 15)),
+             (datetime(2030, 1, 7, 15), datetime(2030, 1, 7, 16)),
+             (datetime(2030, 1, 7, 11), datetime(2030, 1, 7, 12))],
+        )
+
+        response, _ = self.bulk('delete', {'ids': [first, third + 100]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Appointment.objects.count(), 3)
+        response, _ = self.bulk('delete', {'ids': [first, third]})
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.assertEqual(list(Appointment.objects.values_list('pk', flat=True)), [second])
+
+    def test_work_schedules_are_checked_against_each_other(self):
+        WorkSchedule.objects.create(
+            user=self.user, employee=self.employee, day_of_week=0, start_time=time(9), end_time=time(12),
+        )
+        rows = [
+            {'employee': self.employee.pk, 'day_of_week': 0, 'start_time': '11:00', 'end_time': '13:00'},
+            {'employee': self.employee.pk, 'day_of_week': 1, 'start_time': '09:00', 'end_time': '12:00'},
+            {'employee': self.employee.pk, 'day_of_week': 1, 'start_time': '11:00', 'end_time': '14:00'},
+        ]
+        response = self.client.post('/api/workschedule/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([bool(errors) for errors in response.json()], [True, False, True])
+        self.assertEqual(WorkSchedule.objects.count(), 1)
+
+        rows[0]['start_time'], rows[2]['start_time'] = '12:00', '12:00'
+        response = self.client.post('/api/workschedule/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(WorkSchedule.objects.filter(employee=self.employee).count(), 4)
+
+
+class WorkScheduleTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+        self.employee = Employee.objects.create(user=self.user, name='Maria')
+
+    def test_overlap_check_ignores_rows_without_hours(self):
+        WorkSchedule.objects.create(user=self.user, employee=self.employee, day_of_week=0)
+        row = {'employee': self.employee.pk, 'day_of_week': 0, 'start_time': '09:00', 'end_time': '12:00'}
+        response = self.client.post('/api/workschedule/', row, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        # One query looks for overlapping rows, whatever the number of rows of that day
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/api/workschedule/', {**row, 'start_time': '11:00', 'end_time': '13:00'}, format='json',
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {'non_field_errors': ["This employee's schedule overlaps with an existing entry."]},
+        )
+        self.assertEqual(len([query for query in queries if 'services_workschedule' in query['sql']]), 1)
+
+    def put_week(self, days):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(
+                '/api/workschedule/week/', {'employee': self.employee.pk, 'days': days}, format='json',
+            )
+        return response, len(queries)
+
+    def test_week_is_replaced_in_one_request(self):
+        WorkSchedule.objects.create(
+            user=self.user, employee=self.employee, day_of_week=6, start_time=time(9), end_time=time(12),
+        )
+        response, _ = self.put_week([
+            {'day_of_week': 0, 'start_time': '09:00', 'end_time': '12:00'},
+            {'day_of_week': 0, 'start_time': '11:00', 'end_time': '15:00'},
+            {'day_of_week': 1, 'start_time': '11:00', 'end_time': '15:00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([bool(errors) for errors in response.json()['days']], [False, True, False])
+        self.assertEqual(list(WorkSchedule.objects.values_list('day_of_week', flat=True)), [6])
+
+        response, small = self.put_week([{'day_of_week': 0, 'start_time': '09:00', 'end_time': '12:00'}])
+        self.assertEqual(response.status_code, 200)
+        week = [{'day_of_week': day, 'start_time': '09:00', 'end_time': '17:00'} for day in range(7)]
+        response, large = self.put_week(week)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(small, large)
+        self.assertEqual(
+            list(WorkSchedule.objects.values_list('day_of_week', 'start_time', 'end_time')),
+            [(day, time(9), time(17)) for day in range(7)],
+        )
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='parola-test')
+        self.client.force_authenticate(self.user)
+        service = Service.objects.create(user=self.user, name='Tuns', time=60)
+        employee = Employee.objects.create(user=self.user, name='Maria')
+        self.customer = Client.objects.create(user=self.user, name='Ana Pop', email='ana@example.com')
+        Client.objects.create(user=self.user, name='Ion Rus', email='ion@example.com')
+        for day in (7, 8, 9):
+            Appointment.objects.create(
+                user=self.user, client=self.customer, service=service, employee=employee,
+                date=datetime(2030, 1, day, 10),
+            )
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        # The rows are read while the response is sent, in one query whatever their number
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content).decode()
+        return response, content
+
+    def test_appointments_as_csv(self):
+        response, content = self.export('/api/appointments/export/', date_from='2030-01-08')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="appointments.csv"')
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([row['date'] for row in rows], ['2030-01-08 10:00:00', '2030-01-09 10:00:00'])
+        self.assertEqual(
+            {key: rows[0][key] for key in ('end_date', 'status', 'client', 'client_email', 'service', 'employee')},
+            {'end_date': '2030-01-08 11:00:00', 'status': 'scheduled', 'client': 'Ana Pop',
+             'client_email': 'ana@example.com', 'service': 'Tuns', 'employee': 'Maria'},
+        )
+
+    def test_clients_as_ndjson(self):
+        response, content = self.export('/api/clients/export/', type='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(
+            [json.loads(line) for line in content.splitlines()],
+            [{'id': self.customer.pk, 'name': 'Ana Pop', 'email': 'ana@example.com'},
+             {'id': self.customer.pk + 1, 'name': 'Ion Rus', 'email': 'ion@example.com'}],
+        )
@@ -1,3 +1,6 @@
-urlpatterns = [
+from django.urls import path
+from .views import CacheStatsView
 
-]
\ No newline at end of file
+urlpatterns = [
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+]
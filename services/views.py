@@ -1,20 +1,106 @@
-from .models import Company, Service, Employee, Client, Appointment, WorkSchedule
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from . import bulk
+from .availability import employee_slots, category_slots, window_bounds
+from .cache import CachedListMixin, stats
+from .conditional import ConditionalGetMixin
+from .export import APPOINTMENT_COLUMNS, CLIENT_COLUMNS, stream_export
+from .models import Company, Service, Employee, Client, Appointment, WorkSchedule, AppointmentDeletion, \
+    EmployeeDayOccupancy, AppointmentSeries, APPOINTMENT_OVERLAP_CONSTRAINT
+from .pagination import AppointmentChangesPagination, AppointmentPagination, NamePagination
 from .serializers import CompanySerializer, ServiceSerializer, EmployeeSerializer, ClientSerializer, \
-    AppointmentSerializer, WorkScheduleSerializer
-from rest_framework import viewsets, permissions
-from rest_framework.permissions import IsAuthenticated
+    AppointmentSerializer, WorkScheduleSerializer, AvailabilityQuerySerializer, AppointmentFilterSerializer, \
+    AppointmentBulkItemSerializer, WorkScheduleBulkItemSerializer, BulkDeleteSerializer, \
+    AppointmentChangesQuerySerializer, EmployeeDayOccupancySerializer, OccupancyFilterSerializer, \
+    WeeklyScheduleSerializer, AppointmentSeriesSerializer, AppointmentSeriesExceptionSerializer, \
+    SeriesOccurrencesQuerySerializer, ExportQuerySerializer
+from .recurrence import series_busy
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 from .models import ServiceCategory
 from .serializers import ServiceCategorySerializer
 
 
-class CompanyViewSet(viewsets.ModelViewSet):
+def save_appointment(serializer, **kwargs):
+    """
+    Save an appointment, turning a violation of the overlap constraint into a validation error.
+
+    The serializer already rejects overlaps, but two concurrent bookings can both pass that check;
+    the database constraint then lets only one of them through.
+    """
+    try:
+        with transaction.atomic():
+            serializer.save(**kwargs)
+    except IntegrityError as exc:
+        if APPOINTMENT_OVERLAP_CONSTRAINT not in str(exc):
+            raise
+        raise ValidationError({
+            'date': "This employee is already booked at that time. Please choose another time."
+        })
+
+
+class BulkWriteMixin:
+    """
+    Adds POST/PATCH/DELETE `bulk/` to a viewset: a list of items is created or updated, or
+    {"ids": [...]} deleted, in one transaction. Either every item is written or the response lists
+    the errors of each item in request order.
+    """
+    bulk_item_serializer_class = None
+    bulk_create = None
+    bulk_update = None
+    bulk_delete = None
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        if request.method == 'DELETE':
+            params = BulkDeleteSerializer(data=request.data)
+            params.is_valid(raise_exception=True)
+            deleted = self.bulk_delete(request.user, params.validated_data['ids'])
+            return Response({'deleted': deleted})
+
+        items = self.bulk_item_serializer_class(
+            data=request.data,
+            many=True,
+            partial=request.method == 'PATCH',
+            allow_empty=False,
+            max_length=bulk.BULK_MAX_ITEMS,
+        )
+        items.is_valid(raise_exception=True)
+
+        if request.method == 'POST':
+            objects = self.bulk_create(request.user, items.validated_data)
+            response_status = status.HTTP_201_CREATED
+        else:
+            objects = self.bulk_update(request.user, items.validated_data)
+            response_status = status.HTTP_200_OK
+
+        queryset = self.get_queryset().filter(pk__in=[obj.pk for obj in objects])
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data, status=response_status)
+
+
+class CompanyViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
+    etag_models = [Company]
 
     def get_queryset(self):
         # Filter to show only the company belonging to the logged-in user
-        return Company.objects.filter(user=self.request.user)
+        serializer_class = self.get_serializer_class()
+        return serializer_class.setup_eager_loading(
+            Company.objects.filter(user=self.request.user),
+            fields=serializer_class.requested_fields(self.request),
+        )
 
     def perform_create(self, serializer):
         # Automatically assign the logged-in user as the owner of the new company
@@ -37,15 +123,21 @@ class CompanyViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(ConditionalGetMixin, CachedListMixin, viewsets.ModelViewSet):
     serializer_class = ServiceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NamePagination
+    etag_models = [Service]
 
     def get_queryset(self):
         """
         Returnează serviciile asociate utilizatorului autentificat.
         """
-        return Service.objects.filter(user=self.request.user)
+        serializer_class = self.get_serializer_class()
+        return serializer_class.setup_eager_loading(
+            Service.objects.filter(user=self.request.user),
+            fields=serializer_class.requested_fields(self.request),
+        )
 
     def perform_create(self, serializer):
         """
@@ -111,15 +203,35 @@ class ServiceViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ServiceCategoryViewSet(viewsets.ModelViewSet):
+class ServiceCategoryViewSet(ConditionalGetMixin, CachedListMixin, viewsets.ModelViewSet):
     serializer_class = ServiceCategorySerializer
     permission_classes = [IsAuthenticated]
+    etag_models = [ServiceCategory, Service, Employee]
 
     def get_queryset(self):
         """
-        Returnează doar categoriile create de utilizatorul autentificat.
+        Returnează doar categoriile create de utilizatorul autentificat, cu serviciile și angajații
+        utilizatorului preîncărcați (câte o interogare pentru toată lista).
         """
-        return ServiceCategory.objects.filter(user=self.request.user)
+        user = self.request.user
+        fields = self.get_serializer_class().requested_fields(self.request)
+        queryset = ServiceCategory.objects.filter(user=user)
+        # Cu ?fields= sărim join-urile și preîncărcările câmpurilor necerute
+        if fields is None or 'user' in fields:
+            queryset = queryset.select_related('user')
+        if fields is None or 'services' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'services',
+                queryset=ServiceSerializer.setup_eager_loading(Service.objects.filter(user=user)),
+                to_attr='user_services',
+            ))
+        if fields is None or 'employees' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'employees',
+                queryset=Employee.objects.filter(user=user).only('id', 'name'),
+                to_attr='user_employees',
+            ))
+        return queryset
 
     def perform_create(self, serializer):
         """
@@ -156,15 +268,21 @@ class ServiceCategoryViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(ConditionalGetMixin, CachedListMixin, viewsets.ModelViewSet):
     serializer_class = EmployeeSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NamePagination
+    etag_models = [Employee, ServiceCategory, WorkSchedule]
 
     def get_queryset(self):
         """
         Returnează doar angajații care aparțin utilizatorului autentificat.
         """
-        return Employee.objects.filter(user=self.request.user)
+        serializer_class = self.get_serializer_class()
+        return serializer_class.setup_eager_loading(
+            Employee.objects.filter(user=self.request.user),
+            fields=serializer_class.requested_fields(self.request),
+        )
 
     def perform_create(self, serializer):
         """
@@ -210,15 +328,21 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NamePagination
+    etag_models = [Client]
 
     def get_queryset(self):
         """
         Returnează doar clienții asociați utilizatorului autentificat.
         """
-        return Client.objects.filter(user=self.request.user)
+        serializer_class = self.get_serializer_class()
+        return serializer_class.setup_eager_loading(
+            Client.objects.filter(user=self.request.user),
+            fields=serializer_class.requested_fields(self.request),
+        )
 
     def perform_create(self, serializer):
         """
@@ -264,16 +388,58 @@ class ClientViewSet(viewsets.ModelViewSet):
 
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=False, url_path='export')
+    def export(self, request):
+        """
+        Exportă toți clienții ca CSV sau NDJSON (?type=), în flux, fără a-i ține în memorie.
+        """
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        clients = Client.objects.filter(user=request.user).order_by('id')
+        return stream_export(clients, CLIENT_COLUMNS, params.validated_data['type'], 'clients')
+
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ConditionalGetMixin, BulkWriteMixin, viewsets.ModelViewSet):
     serializer_class = AppointmentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AppointmentPagination
+    bulk_item_serializer_class = AppointmentBulkItemSerializer
+    bulk_create = staticmethod(bulk.create_appointments)
+    bulk_update = staticmethod(bulk.update_appointments)
+    bulk_delete = staticmethod(bulk.delete_appointments)
+    etag_models = [Appointment, Client, Service, Employee, ServiceCategory, WorkSchedule]
+    last_modified_field = 'updated_at'
 
     def get_queryset(self):
         """
         Return only appointments belonging to the authenticated user.
         """
-        return Appointment.objects.filter(user=self.request.user)
+        serializer_class = self.get_serializer_class()
+        return serializer_class.setup_eager_loading(
+            Appointment.objects.filter(user=self.request.user),
+            fields=serializer_class.requested_fields(self.request),
+            expand=serializer_class.requested_expansions(self.request),
+        )
+
+    def filter_queryset(self, queryset):
+        """
+        Narrow the appointments by the date window, status, employee, client and service
+        query parameters, all applied in SQL.
+        """
+        params = AppointmentFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        if 'date_from' in query:
+            queryset = queryset.filter(date__gte=query['date_from'])
+        if 'date_to' in query:
+            queryset = queryset.filter(date__lt=query['date_to'])
+        if query.get('status'):
+            queryset = queryset.filter(status__in=query['status'])
+        for field in ('employee_id', 'client_id', 'service_id'):
+            if field in query:
+                queryset = queryset.filter(**{field: query[field]})
+        return queryset
 
     def perform_create(self, serializer):
         print("Data received:", serializer.validated_data)  # Log pentru verificare
@@ -296,7 +462,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             raise ValidationError("An appointment with this service, employee, and date already exists.")
 
         # Save the new appointment
-        serializer.save(user=self.request.user)
+        save_appointment(serializer, user=self.request.user)
 
     def perform_update(self, serializer):
         """
@@ -322,7 +488,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             raise ValidationError("An appointment with this service, employee, and date already exists.")
 
         # Save the updated appointment
-        serializer.save()
+        save_appointment(serializer)
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -336,10 +502,140 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=False, url_path='export')
+    def export(self, request):
+        """
+        Stream the appointments as CSV or NDJSON (?type=), narrowed by the same query parameters
+        as the list. Rows are projected straight from the database, without serializers.
+        """
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        appointments = self.filter_queryset(Appointment.objects.filter(user=request.user)).order_by('date', 'id')
+        return stream_export(appointments, APPOINTMENT_COLUMNS, params.validated_data['type'], 'appointments')
+
+    @action(detail=False, url_path='changes')
+    def changes(self, request):
+        """
+        Return the appointments changed after `since`, a page at a time, and on the last page the
+        ids deleted after it, plus the watermark to pass as `since` once `next` is null. Without
+        `since` every appointment is returned, across as many pages as needed.
+
+        The watermark lags CHANGE_COMMIT_MARGIN seconds behind the first page, so changes committed
+        just after it are not missed. Items may repeat across calls, so clients should apply them
+        idempotently.
+        """
+        params = AppointmentChangesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data.get('since')
+        watermark = params.validated_data.get('watermark') \
+            or timezone.now() - timedelta(seconds=settings.CHANGE_COMMIT_MARGIN)
+
+        changed = self.get_queryset()
+        deleted = AppointmentDeletion.objects.filter(user=request.user, deleted_at__lte=watermark)
+        if since is None:
+            deleted = deleted.none()
+        else:
+            oldest = timezone.now() - timedelta(days=settings.APPOINTMENT_DELETION_RETENTION_DAYS)
+            if since < oldest:
+                return Response(
+                    {"detail": "The watermark is older than the deletion history. Please sync from scratch."},
+                    status=status.HTTP_410_GONE,
+                )
+            changed = changed.filter(updated_at__gt=since)
+            deleted = deleted.filter(deleted_at__gt=since)
+
+        paginator = AppointmentChangesPagination()
+        page = paginator.paginate_queryset(changed, request, view=self)
+        next_link = paginator.get_next_link()
+        if next_link:
+            next_link = replace_query_param(next_link, 'watermark', watermark.isoformat())
+            # Deletions come with the last page, after every change they may follow
+            deleted = deleted.none()
+
+        return Response({
+            'changed': self.get_serializer(page, many=True).data,
+            'deleted': list(deleted.values_list('appointment_id', flat=True)),
+            'next': next_link,
+            'watermark': watermark,
+        })
+
+
+class AppointmentSeriesViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """
+    Recurring appointments. A series is stored once and its occurrences are expanded only for
+    the window asked for; moved or cancelled occurrences are kept as exceptions.
+    """
+    serializer_class = AppointmentSeriesSerializer
+    permission_classes = [IsAuthenticated]
+    etag_models = [AppointmentSeries]
+    last_modified_field = 'updated_at'
+
+    def get_queryset(self):
+        serializer_class = self.get_serializer_class()
+        return serializer_class.setup_eager_loading(
+            AppointmentSeries.objects.filter(user=self.request.user),
+            fields=serializer_class.requested_fields(self.request),
+        )
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @action(detail=False, url_path='occurrences')
+    def occurrences(self, request):
+        """
+        Return the occurrences of every series, or of one employee's, between date_from and date_to.
+        """
+        params = SeriesOccurrencesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        employees = Employee.objects.filter(user=request.user)
+        if 'employee_id' in query:
+            employees = employees.filter(pk=query['employee_id'])
+
+        busy = series_busy(employees.values('id'), *window_bounds(query['date_from'], query['date_to']))
+        occurrences = sorted(
+            (occurrence for employee_occurrences in busy.values() for occurrence in employee_occurrences),
+            key=lambda occurrence: (occurrence.date, occurrence.series.pk),
+        )
+        return Response([
+            {
+                'series_id': occurrence.series.pk,
+                'client_id': occurrence.series.client_id,
+                'service_id': occurrence.series.service_id,
+                'employee_id': occurrence.series.employee_id,
+                'date': occurrence.date,
+                'end_date': occurrence.end_date,
+            }
+            for occurrence in occurrences
+        ])
+
+    @action(detail=True, methods=['post'], url_path='exceptions')
+    def exceptions(self, request, pk=None):
+        """
+        Move or cancel one occurrence; posting the same original_date again replaces the change.
+        """
+        series = self.get_object()
+        serializer = AppointmentSeriesExceptionSerializer(data=request.data, context={'series': series})
+        serializer.is_valid(raise_exception=True)
+        exception, _ = series.exceptions.update_or_create(
+            original_date=serializer.validated_data['original_date'],
+            defaults={
+                'new_date': serializer.validated_data.get('new_date'),
+                'cancelled': serializer.validated_data.get('cancelled', False),
+            },
+        )
+        return Response(AppointmentSeriesExceptionSerializer(exception).data, status=status.HTTP_201_CREATED)
+
 
-class WorkScheduleViewSet(viewsets.ModelViewSet):
+class WorkScheduleViewSet(ConditionalGetMixin, BulkWriteMixin, viewsets.ModelViewSet):
     serializer_class = WorkScheduleSerializer
     permission_classes = [permissions.IsAuthenticated]
+    bulk_item_serializer_class = WorkScheduleBulkItemSerializer
+    bulk_create = staticmethod(bulk.create_work_schedules)
+    bulk_update = staticmethod(bulk.update_work_schedules)
+    bulk_delete = staticmethod(bulk.delete_work_schedules)
+    etag_models = [WorkSchedule]
 
     def get_queryset(self):
         """
@@ -353,3 +649,102 @@ class WorkScheduleViewSet(viewsets.ModelViewSet):
         Setăm utilizatorul autentificat ca proprietar al programului de lucru.
         """
         serializer.save(user=self.request.user)
+
+    @action(detail=False, methods=['put'], url_path='week')
+    def week(self, request):
+        """
+        Înlocuiește tot programul săptămânal al unui angajat dintr-o singură cerere.
+        """
+        params = WeeklyScheduleSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+
+        schedules = bulk.replace_week(
+            request.user, params.validated_data['employee'], params.validated_data['days']
+        )
+        return Response(self.get_serializer(schedules, many=True).data)
+
+
+class AvailabilityViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        """
+        Return the bookable start times of a service over a date range, either for one employee
+        (employee_id) or merged across every employee of a category (category_id, defaulting to
+        the service's own category).
+        """
+        params = AvailabilityQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        service = get_object_or_404(Service, pk=query['service_id'], user=request.user)
+        if service.time <= 0:
+            raise ValidationError({"service_id": "This service has no duration set."})
+
+        response = {
+            'service_id': service.id,
+            'date_from': query['date_from'],
+            'date_to': query['date_to'],
+            'duration': service.time,
+        }
+
+        if 'employee_id' in query:
+            employee = get_object_or_404(Employee, pk=query['employee_id'], user=request.user)
+            response['employee_id'] = employee.id
+            response['slots'] = employee_slots(
+                employee, service, query['date_from'], query['date_to'], step=query['step']
+            )
+            return Response(response)
+
+        category_id = query.get('category_id', service.service_category_id)
+        if category_id is None:
+            raise ValidationError({"category_id": "This field is required for services without a category."})
+        category = get_object_or_404(ServiceCategory, pk=category_id, user=request.user)
+
+        response['category_id'] = category.id
+        response['slots'] = [
+            {'start': start, 'employee_ids': employee_ids}
+            for start, employee_ids in category_slots(
+                request.user, category, service, query['date_from'], query['date_to'], step=query['step']
+            )
+        ]
+        return Response(response)
+
+
+class OccupancyViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Daily booked and scheduled minutes per employee, read from the materialized occupancy table.
+    Days without a row have no bookings.
+    """
+    serializer_class = EmployeeDayOccupancySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return EmployeeDayOccupancy.objects.filter(user=self.request.user)
+
+    def filter_queryset(self, queryset):
+        params = OccupancyFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        if 'employee_id' in query:
+            queryset = queryset.filter(employee_id=query['employee_id'])
+        if 'date_from' in query:
+            queryset = queryset.filter(date__gte=query['date_from'])
+        if 'date_to' in query:
+            queryset = queryset.filter(date__lte=query['date_to'])
+        if query['fully_booked'] is True:
+            queryset = queryset.filter(scheduled_minutes__gt=0, booked_minutes__gte=F('scheduled_minutes'))
+        elif query['fully_booked'] is False:
+            queryset = queryset.exclude(scheduled_minutes__gt=0, booked_minutes__gte=F('scheduled_minutes'))
+        return queryset
+
+
+class CacheStatsView(APIView):
+    """
+    Hit and miss counters of the per-tenant list cache.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(stats(['services', 'service_category', 'employees']))
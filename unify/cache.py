@@ -0,0 +1,14 @@
+from django.core.cache import caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+
+
+def is_shared_cache(alias='default'):
+    """
+    Whether the cache is an in-memory server shared by every worker (Redis, Memcached).
+
+    Caches invalidated from signals, or trusted to forget revoked credentials, need one: a
+    per-process cache only sees the invalidations of its own worker, and the database cache
+    costs more queries than the lookups it would save.
+    """
+    return isinstance(caches[alias], (RedisCache, BaseMemcachedCache))
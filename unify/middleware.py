@@ -0,0 +1,97 @@
+import secrets
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+
+def accepted_encodings(header):
+    """
+    Return the content codings an Accept-Encoding header allows (q > 0).
+    """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def brotli_padding(max_random_bytes):
+    """
+    A metadata meta-block of 1 to max_random_bytes (at most 256) bytes, which decoders skip (RFC 7932, 9.2).
+    """
+    length = secrets.randbelow(max_random_bytes) + 1
+    # ISLAST=0, MNIBBLES=0 (metadata), reserved bit, MSKIPBYTES=1, MSKIPLEN-1 and two alignment bits
+    header = 0b0110 | 1 << 4 | (length - 1) << 6
+    return header.to_bytes(2, 'little') + bytes(length)
+
+
+def compress(content, encoding):
+    # Random padding against BREACH, as django.middleware.gzip does in the gzip header
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        # flush() ends the stream header on a byte boundary, where the padding block can go
+        header = compressor.process(b'') + compressor.flush()
+        padding = brotli_padding(CompressionMiddleware.max_random_bytes)
+        return header + padding + compressor.process(content) + compressor.finish()
+    return compress_string(content, max_random_bytes=CompressionMiddleware.max_random_bytes)
+
+
+def negotiate(request):
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses text and JSON responses of at least COMPRESSION_MIN_SIZE bytes with brotli, when
+    installed and accepted by the client, or gzip. Streaming responses (the exports) are passed
+    through untouched, as are responses that already have a Content-Encoding.
+    """
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request)
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The ETag names the uncompressed representation, so it can only match weakly now
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -72,6 +72,7 @@ CSRF_TRUSTED_ORIGINS = ['http://localhost:3000', 'http://127.0.0.1:8000']
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'unify.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -125,6 +126,40 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    # Fără Redis fiecare proces are cache-ul lui, deci listele de servicii și tokenurile
+    # nu mai sunt păstrate în cache (vezi unify/cache.py)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Per-tenant cache of the services, categories and employees lists
+SERVICES_CACHE_ALIAS = 'default'
+SERVICES_CACHE_TIMEOUT = int(os.getenv('SERVICES_CACHE_TIMEOUT', 300))
+
+# Seconds a write may take between stamping a change and committing it (Last-Modified, changes feed)
+CHANGE_COMMIT_MARGIN = int(os.getenv('CHANGE_COMMIT_MARGIN', 5))
+
+# How long tombstones of deleted appointments are kept for the changes feed
+APPOINTMENT_DELETION_RETENTION_DAYS = int(os.getenv('APPOINTMENT_DELETION_RETENTION_DAYS', 90))
+
+# Response compression (unify/middleware.py); smaller bodies are sent as they are
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -163,10 +198,19 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    # Token, JWT și sesiune, alese după headerul Authorization (vezi users/authentication.py)
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
-        'dj_rest_auth.jwt_auth.JWTCookieAuthentication',
+        'users.authentication.FastPathAuthentication',
+    ],
+    # orjson când este instalat, altfel json din biblioteca standard (vezi unify/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'unify.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'unify.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 REST_AUTH_REGISTER_SERIALIZERS = {
@@ -181,8 +225,20 @@ REST_USE_JWT = True
 JWT_AUTH_COOKIE = 'my-app-auth'
 
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'users.backends.EmailBackend',
+]
+# Primul hasher se folosește pentru parolele noi; parolele hash-uite cu celelalte sunt re-hash-uite
+# la următoarea autentificare reușită. Lista se poate schimba din mediu (separată prin virgulă).
+PASSWORD_HASHERS = [hasher.strip() for hasher in os.getenv('PASSWORD_HASHERS', '').split(',') if hasher.strip()] or [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
 ]
+# How long a token and its user are trusted from the cache by CachedTokenAuthentication, which
+# is also the longest a revoked token may keep working. Only used with Redis or Memcached.
+AUTH_TOKEN_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_USER_CACHE_TIMEOUT', 30))
 ACCOUNT_USER_MODEL_USERNAME_FIELD = None  # Nu mai folosim username
 ACCOUNT_EMAIL_REQUIRED = True
 ACCOUNT_USERNAME_REQUIRED = False
@@ -200,5 +256,10 @@ EMAIL_HOST_PASSWORD = str(os.getenv('EMAIL_HOST_PASSWORD'))
 DEFAULT_FROM_EMAIL = str(os.getenv('DEFAULT_FROM_EMAIL'))
 
 GOOGLE_CLIENT_ID = str(os.getenv('GOOGLE_CLIENT_ID'))
+# Signing certificates of Google ID tokens, cached for their Cache-Control max-age (users/google.py)
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_HTTP_TIMEOUT = float(os.getenv('GOOGLE_HTTP_TIMEOUT', 5))
+# How long a verified ID token is answered from the cache (never past its expiry)
+GOOGLE_TOKEN_CACHE_TTL = int(os.getenv('GOOGLE_TOKEN_CACHE_TTL', 60))
 
 django_heroku.settings(locals())
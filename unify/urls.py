@@ -19,7 +19,7 @@ from django.urls import path, include
 from dj_rest_auth.views import PasswordResetView, PasswordResetConfirmView
 from rest_framework.routers import DefaultRouter
 from services.views import CompanyViewSet, ServiceCategoryViewSet, ServiceViewSet, EmployeeViewSet, ClientViewSet, \
-    AppointmentViewSet, WorkScheduleViewSet
+    AppointmentViewSet, WorkScheduleViewSet, AvailabilityViewSet, OccupancyViewSet, AppointmentSeriesViewSet
 
 router = DefaultRouter()
 router.register('company', CompanyViewSet, basename='company')
@@ -28,7 +28,10 @@ router.register('services', ServiceViewSet, basename='services')
 router.register('employees', EmployeeViewSet, basename='employees')
 router.register(r'clients', ClientViewSet, basename='client')
 router.register(r'appointments', AppointmentViewSet, basename='appointments')
+router.register(r'appointment-series', AppointmentSeriesViewSet, basename='appointment-series')
 router.register(r'workschedule', WorkScheduleViewSet, basename='workschedule')
+router.register(r'availability', AvailabilityViewSet, basename='availability')
+router.register(r'occupancy', OccupancyViewSet, basename='occupancy')
 
 
 urlpatterns = [
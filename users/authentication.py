@@ -0,0 +1,62 @@
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import (
+    BaseAuthentication, SessionAuthentication, TokenAuthentication, get_authorization_header,
+)
+from rest_framework_simplejwt.authentication import AUTH_HEADER_TYPE_BYTES
+
+from unify.cache import is_shared_cache
+
+from .tokens import token_cache_key
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps each token, with its user, in the cache for
+    AUTH_TOKEN_USER_CACHE_TIMEOUT seconds instead of querying Token joined to the user on every
+    request. Logout, token deletion and any change to the user (e.g. deactivation) drop the
+    entry right away (see users.signals).
+
+    A request that read the token just before its deletion may still store it afterwards, so a
+    revoked token can keep working for up to AUTH_TOKEN_USER_CACHE_TIMEOUT seconds. Without a
+    shared in-memory cache (Redis, Memcached) it is plain TokenAuthentication: other workers would
+    not see a per-process cache forget the token, and the database cache costs more queries.
+    """
+    def authenticate_credentials(self, key):
+        if not is_shared_cache():
+            return super().authenticate_credentials(key)
+
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            # Raises AuthenticationFailed for unknown keys and inactive users, which are never cached
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, timeout=settings.AUTH_TOKEN_USER_CACHE_TIMEOUT)
+        return token.user, token
+
+
+class FastPathAuthentication(BaseAuthentication):
+    """
+    The API's authentication schemes behind a single class that reads the Authorization header
+    once and runs only the matching scheme: `Token ...` goes to CachedTokenAuthentication and
+    `Bearer ...` to the JWT authentication, so header-authenticated requests never load the
+    session. Requests without such a header fall back to the session, then to the JWT cookie.
+    """
+    def __init__(self):
+        self.token = CachedTokenAuthentication()
+        self.session = SessionAuthentication()
+        self.jwt = JWTCookieAuthentication()
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if auth:
+            if auth[0].lower() == self.token.keyword.lower().encode():
+                return self.token.authenticate(request)
+            if auth[0] in AUTH_HEADER_TYPE_BYTES:
+                return self.jwt.authenticate(request)
+        return self.session.authenticate(request) or self.jwt.authenticate(request)
+
+    def authenticate_header(self, request):
+        # Ca înainte, când TokenAuthentication era prima clasă: răspunsurile neautentificate sunt 401
+        return self.token.authenticate_header(request)
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    """
+    ModelBackend that leaves the user it looked up (or None) on `request.login_user`, so the login
+    view can tell an unknown email from a wrong password without querying the user again.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            user = None
+            # Run the default password hasher once to reduce the timing difference between an
+            # existing and a nonexistent user, as ModelBackend does
+            UserModel().set_password(password)
+        if request is not None:
+            request.login_user = user
+        if user is not None and user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,100 @@
+import hashlib
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from google.auth.transport.requests import Request
+from google.oauth2 import id_token
+from requests.adapters import HTTPAdapter
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+TOKEN_CACHE_KEY = 'google-id-token:{digest}'
+
+MAX_AGE = re.compile(r'(?:^|,)\s*max-age\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+def cache_lifetime(headers):
+    """
+    Seconds a response may be reused according to its Cache-Control and Age headers.
+    """
+    cache_control = headers.get('Cache-Control', '')
+    if re.search(r'\b(no-store|no-cache)\b', cache_control, re.IGNORECASE):
+        return 0
+    match = MAX_AGE.search(cache_control)
+    if not match:
+        return 0
+    try:
+        age = int(headers.get('Age', 0))
+    except ValueError:
+        age = 0
+    return max(int(match.group(1)) - age, 0)
+
+
+class CachingRequest(Request):
+    """
+    google-auth transport over a pooled requests.Session that keeps GET responses in a process-wide
+    cache for as long as their Cache-Control allows, so the signing certificates are fetched about
+    once a day per worker instead of on every login.
+    """
+    _responses = {}  # url -> (expires, response)
+    _lock = threading.Lock()
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        if method != 'GET':
+            return super().__call__(url, method, body, headers, timeout or settings.GOOGLE_HTTP_TIMEOUT, **kwargs)
+
+        with self._lock:
+            expires, response = self._responses.get(url, (0, None))
+        if response is not None and expires > time.monotonic():
+            return response
+
+        response = super().__call__(url, method, body, headers, timeout or settings.GOOGLE_HTTP_TIMEOUT, **kwargs)
+        lifetime = cache_lifetime(response.headers) if response.status == 200 else 0
+        if lifetime:
+            with self._lock:
+                self._responses[url] = (time.monotonic() + lifetime, response)
+        return response
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._responses.clear()
+
+
+def _session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+# One transport per process: its session keeps the TLS connections to Google open between logins
+transport = CachingRequest(session=_session())
+
+
+def verify_google_token(token):
+    """
+    Verify a Google ID token for GOOGLE_CLIENT_ID and return its claims.
+
+    A token verified in the last GOOGLE_TOKEN_CACHE_TTL seconds (never past its expiry) is answered
+    from the cache. Raises ValueError when the token is invalid, like id_token.verify_oauth2_token.
+    """
+    key = TOKEN_CACHE_KEY.format(digest=hashlib.sha256(token.encode('utf-8')).hexdigest())
+    idinfo = cache.get(key)
+    if idinfo is not None:
+        return idinfo
+
+    idinfo = id_token.verify_token(
+        token, transport, audience=settings.GOOGLE_CLIENT_ID, certs_url=settings.GOOGLE_CERTS_URL,
+    )
+    if idinfo.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}")
+
+    ttl = min(settings.GOOGLE_TOKEN_CACHE_TTL, int(idinfo.get('exp', 0) - time.time()))
+    if ttl > 0:
+        cache.set(key, idinfo, ttl)
+    return idinfo
@@ -0,0 +1,138 @@
+import time
+import timeit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import FastPathAuthentication
+from users.tokens import forget_tokens
+from users.views import CustomLoginView
+
+PASSWORD = 'benchmark-parola-1234'
+
+# DEFAULT_AUTHENTICATION_CLASSES before FastPathAuthentication
+AUTHENTICATION_CHAIN = [
+    'rest_framework.authentication.TokenAuthentication',
+    'rest_framework.authentication.SessionAuthentication',
+    'dj_rest_auth.jwt_auth.JWTCookieAuthentication',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the cost of each configured password hasher, the queries and time of the login "
+        "endpoint and of authenticating an API request. Nothing is kept in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per hasher (best one is kept).")
+        parser.add_argument('--logins', type=int, default=5, help="Logins timed per scenario.")
+        parser.add_argument('--requests', type=int, default=200, help="API requests authenticated per scenario.")
+
+    def handle(self, *args, **options):
+        self.hashers(options['repeat'])
+        self.logins(options['logins'])
+        self.api_requests(options['requests'])
+
+    def hashers(self, repeat):
+        self.stdout.write("Password hashers (the first one hashes new passwords):")
+        for path in settings.PASSWORD_HASHERS:
+            hasher = import_string(path)()
+            try:
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except ValueError as error:  # the hasher's library is not installed
+                self.stdout.write(f"  {hasher.algorithm:>16}: unavailable ({error})")
+                continue
+            elapsed = min(timeit.repeat(lambda: hasher.verify(PASSWORD, encoded), number=1, repeat=repeat)) * 1000
+            self.stdout.write(f"  {hasher.algorithm:>16}: {elapsed:8.1f} ms per check")
+
+    def logins(self, count):
+        self.stdout.write("Login endpoint:")
+        factory = RequestFactory()
+        view = CustomLoginView.as_view()
+        scenarios = [
+            ('success', PASSWORD),
+            ('wrong password', 'not-the-password'),
+            ('unknown email', PASSWORD),
+        ]
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(email='benchmark-login@example.com', password=PASSWORD)
+            try:
+                for name, password in scenarios:
+                    email = 'nobody@example.com' if name == 'unknown email' else user.email
+                    timings, queries = [], []
+                    for _ in range(count):
+                        request = factory.post('/users/login/', {'email': email, 'password': password},
+                                               content_type='application/json')
+                        started = time.perf_counter()
+                        with CaptureQueriesContext(connection) as captured:
+                            response = view(request)
+                        timings.append((time.perf_counter() - started) * 1000)
+                        queries.append(len(captured))
+                    self.stdout.write(
+                        f"  {name:>16}: HTTP {response.status_code}, {sum(timings) / count:8.1f} ms, "
+                        f"queries first {queries[0]} then {queries[-1]}"
+                    )
+            finally:
+                transaction.set_rollback(True)
+
+    def api_requests(self, count):
+        self.stdout.write("API request authentication (previous class chain vs FastPathAuthentication):")
+        factory = RequestFactory()
+        middleware = [SessionMiddleware(lambda request: None), AuthenticationMiddleware(lambda request: None)]
+        chains = [
+            ('chain', [import_string(path) for path in AUTHENTICATION_CHAIN]),
+            ('fast', [FastPathAuthentication]),
+        ]
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(email='benchmark-api@example.com', password=PASSWORD)
+            token = Token.objects.create(user=user)
+            session = SessionStore()
+            session.update({
+                SESSION_KEY: str(user.pk), BACKEND_SESSION_KEY: settings.AUTHENTICATION_BACKENDS[0],
+                HASH_SESSION_KEY: user.get_session_auth_hash(),
+            })
+            session.create()
+            token_header = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+            bearer_header = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+            scenarios = [
+                ('token', token_header, False),
+                ('bearer', bearer_header, False),
+                ('bearer + session', bearer_header, True),
+                ('session', {}, True),
+            ]
+            try:
+                for name, headers, with_session in scenarios:
+                    results = []
+                    for label, classes in chains:
+                        timings, queries = [], []
+                        for _ in range(count):
+                            request = factory.get('/api/clients/', **headers)
+                            if with_session:
+                                request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+                            for step in middleware:
+                                step.process_request(request)
+                            request = Request(request, authenticators=[cls() for cls in classes])
+                            started = time.perf_counter()
+                            with CaptureQueriesContext(connection) as captured:
+                                authenticated = request.user.is_authenticated
+                            timings.append((time.perf_counter() - started) * 1000)
+                            queries.append(len(captured))
+                        if not authenticated:
+                            self.stdout.write(self.style.WARNING(f"  {name}: {label} did not authenticate."))
+                        results.append(f"{label} {sum(timings) / count:6.3f} ms, {queries[-1]} queries")
+                    self.stdout.write(f"  {name:>16}: " + '   '.join(results))
+            finally:
+                forget_tokens([token.key])
+                transaction.set_rollback(True)
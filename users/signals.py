@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .tokens import forget_tokens
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """
+    Logout deletes the token: requests carrying it must fail right away.
+    """
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_changed_user_tokens(sender, instance, created, **kwargs):
+    """
+    Cached authentications hold a copy of the user, so a deactivated or changed user is reloaded.
+    """
+    if not created:
+        forget_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
@@ -1,3 +1,249 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import rsa
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from google.auth import crypt, jwt
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .google import CachingRequest, cache_lifetime, verify_google_token
+from .models import CustomUser
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+KEY_ID = 'test-key'
+
+
+class FakeCertServer:
+    """
+    Serves {key id: public key} like Google's certificate endpoint, counting the requests per path.
+    """
+    def __init__(self, public_pem, cache_control):
+        self.hits = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits[self.path] = server.hits.get(self.path, 0) + 1
+                body = json.dumps({KEY_ID: public_pem}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', cache_control.get(self.path, ''))
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class GoogleTokenTestMixin:
+    cache_control = {
+        '/certs': 'public, max-age=3600, must-revalidate',
+        '/no-store': 'no-store',
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        public_key, private_key = rsa.newkeys(1024)
+        cls.signer = crypt.RSASigner.from_string(private_key.save_pkcs1().decode('ascii'), key_id=KEY_ID)
+        cls.server = FakeCertServer(public_key.save_pkcs1().decode('ascii'), cls.cache_control).__enter__()
+        cls.addClassCleanup(cls.server.__exit__)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        CachingRequest.clear()
+        self.server.hits.clear()
+        settings = override_settings(GOOGLE_CLIENT_ID=CLIENT_ID, GOOGLE_CERTS_URL=self.server.url('/certs'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def make_token(self, email='ana.pop@example.com', **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': email, 'email': email,
+            'name': 'Ana Pop', 'iat': now, 'exp': now + 3600, **claims,
+        }
+        return jwt.encode(self.signer, payload).decode('ascii')
+
+
+class VerifyGoogleTokenTests(GoogleTokenTestMixin, TestCase):
+    def test_certificates_are_fetched_once_while_fresh(self):
+        self.assertEqual(verify_google_token(self.make_token('a@example.com'))['email'], 'a@example.com')
+        self.assertEqual(verify_google_token(self.make_token('b@example.com'))['email'], 'b@example.com')
+        self.assertEqual(self.server.hits, {'/certs': 1})
+
+    def test_uncacheable_certificates_are_refetched(self):
+        with override_settings(GOOGLE_CERTS_URL=self.server.url('/no-store')):
+            verify_google_token(self.make_token('a@example.com'))
+            verify_google_token(self.make_token('b@example.com'))
+        self.assertEqual(self.server.hits, {'/no-store': 2})
+
+    def test_verified_token_is_answered_from_cache(self):
+        token = self.make_token()
+        verify_google_token(token)
+        CachingRequest.clear()
+        self.assertEqual(verify_google_token(token)['email'], 'ana.pop@example.com')
+        self.assertEqual(self.server.hits, {'/certs': 1})
+
+    def test_invalid_tokens_are_rejected(self):
+        for claims in ({'aud': 'someone-else'}, {'iss': 'https://evil.example.com'}, {'exp': int(time.time()) - 600}):
+            with self.subTest(claims=claims), self.assertRaises(ValueError):
+                verify_google_token(self.make_token(**claims))
+
+    def test_cache_lifetime(self):
+        self.assertEqual(cache_lifetime({'Cache-Control': 'public, max-age=600'}), 600)
+        self.assertEqual(cache_lifetime({'Cache-Control': 'max-age=600', 'Age': '100'}), 500)
+        self.assertEqual(cache_lifetime({'Cache-Control': 'no-cache, max-age=600'}), 0)
+        self.assertEqual(cache_lifetime({}), 0)
+
+
+class GoogleLoginViewTests(GoogleTokenTestMixin, APITestCase):
+    def test_login_creates_user_and_returns_token(self):
+        response = self.client.post('/users/auth/google/', {'token': self.make_token()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['access_token'])
+        self.assertTrue(CustomUser.objects.filter(email='ana.pop@example.com').exists())
+
+        response = self.client.post('/users/auth/google/', {'token': self.make_token()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, {'/certs': 1})
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.post('/users/auth/google/', {'token': self.make_token(aud='other')}, format='json')
+        self.assertIn(response.status_code, (401, 403))
+
+
+class CustomLoginViewTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='ana.pop@example.com', password='secret')
+        self.failures = []
+        user_login_failed.connect(self.record_failure)
+        self.addCleanup(user_login_failed.disconnect, self.record_failure)
+
+    def record_failure(self, sender, credentials, **kwargs):
+        self.failures.append(credentials['username'])
+
+    def login(self, email, password, queries):
+        with self.assertNumQueries(queries):
+            return self.client.post('/users/login/', {'email': email, 'password': password}, format='json')
+
+    def test_valid_credentials_return_the_token(self):
+        Token.objects.create(user=self.user)
+        response = self.login('ana.pop@example.com', 'secret', 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['access_token'], self.user.auth_token.key)
+
+    def test_wrong_password(self):
+        response = self.login('ana.pop@example.com', 'wrong', 1)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.failures, ['ana.pop@example.com'])
+
+    def test_unknown_email_still_hashes_the_password(self):
+        with mock.patch('django.contrib.auth.base_user.make_password') as make_password:
+            response = self.login('nobody@example.com', 'secret', 1)
+        self.assertEqual(response.status_code, 404)
+        make_password.assert_called_once_with('secret')
+        self.assertEqual(self.failures, ['nobody@example.com'])
+
+    def test_inactive_user_is_rejected_like_a_wrong_password(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.login('ana.pop@example.com', 'secret', 1)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.failures, ['ana.pop@example.com'])
+
+
+# The local-memory cache stands in for Redis, as the tests run in a single process
+shared_cache = mock.patch('users.authentication.is_shared_cache', new=lambda alias='default': True)
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='ana.pop@example.com', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/clients/').status_code, 200)
+        return [query['sql'] for query in queries if 'authtoken_token' in query['sql']]
+
+    @shared_cache
+    def test_token_is_looked_up_once(self):
+        self.assertEqual(len(self.auth_queries()), 1)
+        self.assertEqual(self.auth_queries(), [])
+
+    @shared_cache
+    def test_logout_invalidates_token(self):
+        self.auth_queries()
+        self.assertEqual(self.client.post('/users/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/clients/').status_code, 401)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_not_used(self):
+        self.assertEqual(len(self.auth_queries()), 1)
+        self.assertEqual(len(self.auth_queries()), 1)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                                           'LOCATION': 'token_test_cache'}})
+    def test_database_cache_is_not_used(self):
+        # The table does not exist: any cache access would fail the request
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/clients/').status_code, 200)
+        self.assertFalse([query for query in queries if 'token_test_cache' in query['sql']])
+
+    @shared_cache
+    def test_deactivated_user_is_rejected(self):
+        self.auth_queries()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/clients/').status_code, 401)
+
+
+class FastPathAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='ana.pop@example.com', password='secret')
+
+    def test_bearer_header_skips_session(self):
+        self.client.force_login(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/clients/').status_code, 200)
+        self.assertFalse([query for query in queries if 'django_session' in query['sql']])
+
+    def test_session_still_authenticates(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/clients/').status_code, 200)
+
+    def test_unauthenticated_requests_get_token_challenge(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+        response = self.client.get('/api/clients/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
@@ -0,0 +1,17 @@
+import hashlib
+
+from django.core.cache import cache
+
+TOKEN_CACHE_KEY = 'auth-token:key:{digest}'
+
+
+def token_cache_key(key):
+    # Token keys are credentials, so only their digest appears in the cache
+    return TOKEN_CACHE_KEY.format(digest=hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def forget_tokens(keys):
+    """
+    Drop the cached authentications of the token `keys` (see users.authentication).
+    """
+    cache.delete_many([token_cache_key(key) for key in keys])
@@ -1,19 +1,16 @@
 from dj_rest_auth.views import LoginView, PasswordResetConfirmView
-from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth import authenticate, get_user_model
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from django.conf import settings
+from .google import verify_google_token
 from .models import CustomUser  # Importă modelul tău de utilizator personalizat
 from .serializers import GoogleAuthSerializer
-from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authtoken.models import Token  # Importă modelul Token pentru autentificare
+from rest_framework.exceptions import AuthenticationFailed
 from allauth.account.models import EmailAddress
 
-GOOGLE_CLIENT_ID = settings.GOOGLE_CLIENT_ID
-
 
 class GoogleLoginView(APIView):
     """
@@ -30,8 +27,8 @@ class GoogleLoginView(APIView):
         token = serializer.validated_data['token']
 
         try:
-            # Verificăm și decodificăm token-ul
-            idinfo = id_token.verify_oauth2_token(token, requests.Request(), GOOGLE_CLIENT_ID)
+            # Verificăm și decodificăm token-ul (certificatele Google și token-urile verificate sunt în cache)
+            idinfo = verify_google_token(token)
 
             # Extragem informațiile despre utilizator
             email = idinfo.get('email')
@@ -99,18 +96,20 @@ class CustomLoginView(APIView):
                     {"detail": "Contul este dezactivat. Contactează administratorul."},
                     status=status.HTTP_403_FORBIDDEN,
                 )
-        else:
-            # If authentication fails, check if the email exists in the database
-            try:
-                user = User.objects.get(email=email)
-                return Response(
-                    {"detail": "Email-ul există, dar parola este incorectă. Poți reseta parola."},
-                    status=status.HTTP_401_UNAUTHORIZED,
-                )
-            except User.DoesNotExist:
-                # Email does not exist in the database
-                return Response(
-                    {"detail": "Email-ul nu există. Te rugăm să creezi un cont nou."},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
 
+        # EmailBackend leaves the user it looked up on the request, so no second query is needed
+        # to tell a wrong password from an unknown email; other backends don't, so look it up then
+        if hasattr(request, 'login_user'):
+            exists = request.login_user is not None
+        else:
+            exists = User._default_manager.filter(email=email).exists()
+        if exists:
+            return Response(
+                {"detail": "Email-ul există, dar parola este incorectă. Poți reseta parola."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        # Email does not exist in the database
+        return Response(
+            {"detail": "Email-ul nu există. Te rugăm să creezi un cont nou."},
+            status=status.HTTP_404_NOT_FOUND,
+        )